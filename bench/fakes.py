@@ -0,0 +1,228 @@
+import json
+import time
+import asyncio
+import random
+import socket
+import multiprocessing
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+import uvicorn
+
+# ------------------------- Config -------------------------
+# Local stand-ins for every HTTP upstream the bot talks to, served from one
+# port with the upstream name as the first path segment
+# (http://127.0.0.1:<port>/openweather/data/2.5/weather, .../telegram/bot<token>/sendMessage).
+# Each upstream gets its own latency (seconds, jittered ±50%) and error rate;
+# an injected error is a 503, or a 429 with retry_after for Telegram.
+UPSTREAMS = ("telegram", "openweather", "newsapi", "opentdb", "uselessfacts", "coingecko", "fmp", "huggingface")
+DEFAULT_LATENCY = 0.02
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Ryzex Bench", "username": "ryzex_bench_bot"}
+
+
+def jitter(latency):
+    return latency * random.uniform(0.5, 1.5)
+
+
+# ------------------------- Upstream responses -------------------------
+def openweather(path, params):
+    city = params.get("q", "Nowhere")
+    return {"cod": 200, "name": city, "weather": [{"description": "clear sky"}], "main": {"temp": 21.5}}
+
+
+def newsapi(path, params):
+    category = params.get("category", "technology")
+    articles = [{"title": f"{category.title()} headline {i}", "source": {"name": "Bench Wire"}} for i in range(20)]
+    return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+
+def opentdb(path, params):
+    results = [{
+        "question": f"Benchmark question {random.randrange(10 ** 6)}?",
+        "correct_answer": "Yes",
+        "incorrect_answers": ["No", "Maybe", "Never"],
+    } for _ in range(int(params.get("amount", 10)))]
+    return {"response_code": 0, "results": results}
+
+
+def uselessfacts(path, params):
+    return {"id": str(random.randrange(10 ** 6)), "text": f"Fun fact number {random.randrange(10 ** 6)}."}
+
+
+def coingecko(path, params):
+    if path.endswith("/coins/markets"):
+        per_page, page = int(params.get("per_page", 100)), int(params.get("page", 1))
+        start = (page - 1) * per_page
+        return [{"id": f"coin-{n}", "symbol": f"c{n}"} for n in range(start, start + per_page)]
+    currency = params.get("vs_currencies", "usd")
+    return {coin_id: {currency: round(random.uniform(1, 50000), 2)} for coin_id in params.get("ids", "").split(",") if coin_id}
+
+
+def fmp(path, params):
+    tickers = path.rsplit("/", 1)[-1].split(",")
+    return [{"symbol": ticker, "price": round(random.uniform(1, 500), 2)} for ticker in tickers if ticker]
+
+
+def huggingface(path, params):
+    return b"\x89PNG\r\n\x1a\n" + bytes(1024)  # only the size matters to the bot
+
+
+RESPONDERS = {
+    "openweather": openweather,
+    "newsapi": newsapi,
+    "opentdb": opentdb,
+    "uselessfacts": uselessfacts,
+    "coingecko": coingecko,
+    "fmp": fmp,
+    "huggingface": huggingface,
+}
+
+
+# ------------------------- Telegram Bot API -------------------------
+class FakeTelegram:
+    # Answers Bot API methods with just enough of a result for
+    # python-telegram-bot to parse; every other method returns True
+    def __init__(self):
+        self.message_ids = 0
+
+    def message(self, fields):
+        self.message_ids += 1
+        chat_id = fields.get("chat_id", 1)
+        chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else 1
+        return {
+            "message_id": int(fields.get("message_id") or self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": fields.get("text", ""),
+        }
+
+    def call(self, method, fields):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText", "sendPhoto", "sendAudio", "sendVoice", "sendDocument"):
+            return self.message(fields)
+        if method == "getFile":
+            return {"file_id": fields.get("file_id", "file"), "file_unique_id": "file", "file_size": 4, "file_path": "voice/file.oga"}
+        if method == "getUpdates":
+            return []
+        return True
+
+
+def parse_fields(headers, body):
+    content_type = headers.get(b"content-type", b"").decode()
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return {key: values[-1] for key, values in parse_qs(body.decode()).items()}
+    return {}  # multipart uploads: nothing the fake needs
+
+
+# ------------------------- ASGI app -------------------------
+class FakeUpstreams:
+    def __init__(self, latency=None, errors=None):
+        self.latency = latency or {}
+        self.errors = errors or {}
+        self.telegram = FakeTelegram()
+        self.stats = {name: {"requests": 0, "errors": 0} for name in UPSTREAMS}
+        self.methods = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        upstream, _, path = scope["path"].lstrip("/").partition("/")
+        status, payload = await self.handle(upstream, "/" + path, scope, body)
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        content_type = b"application/octet-stream" if isinstance(payload, bytes) else b"application/json"
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(len(data)).encode())]})
+        await send({"type": "http.response.body", "body": data})
+
+    async def handle(self, upstream, path, scope, body):
+        if upstream == "_stats":
+            return 200, {"upstreams": self.stats, "telegram_methods": self.methods}
+        if upstream not in self.stats:
+            return 404, {"error": "unknown upstream"}
+        stats = self.stats[upstream]
+        stats["requests"] += 1
+        await asyncio.sleep(jitter(self.latency.get(upstream, DEFAULT_LATENCY)))
+        if random.random() < self.errors.get(upstream, 0):
+            stats["errors"] += 1
+            if upstream == "telegram":
+                return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                             "parameters": {"retry_after": 1}}
+            return 503, {"error": "injected failure"}
+        params = {key: values[-1] for key, values in parse_qs(scope["query_string"].decode()).items()}
+        if upstream == "telegram":
+            if path.startswith("/file/"):
+                return 200, b"OggS"
+            method = path.rsplit("/", 1)[-1]
+            self.methods[method] = self.methods.get(method, 0) + 1
+            fields = parse_fields(dict(scope["headers"]), body)
+            return 200, {"ok": True, "result": self.telegram.call(method, fields)}
+        return 200, RESPONDERS[upstream](path, params)
+
+
+def serve(port, latency=None, errors=None):
+    config = uvicorn.Config(FakeUpstreams(latency, errors), host="127.0.0.1", port=port,
+                            log_level="warning", access_log=False, lifespan="off")
+    uvicorn.Server(config).run()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start(latency=None, errors=None, port=None, timeout=15):
+    # Runs the fakes in their own process, so they don't compete with the
+    # bot for the event loop; returns (process, base url)
+    port = port or free_port()
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(port, latency, errors), daemon=True)
+    process.start()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError("Fake upstreams did not start")
+            time.sleep(0.05)
+    return process, f"http://127.0.0.1:{port}"
+
+
+# ------------------------- Gemini -------------------------
+class FakeModel:
+    # Stands in for genai.GenerativeModel: the SDK talks gRPC to Google, so
+    # instead of a server the bench swaps the model object itself. Like the
+    # real one it blocks the calling thread (the bot runs it in the llm pool).
+    def __init__(self, latency=0.5, error_rate=0.0, chunks=5):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.chunks = chunks
+
+    def generate_content(self, contents, stream=False):
+        if stream:
+            return self._stream()
+        time.sleep(jitter(self.latency))
+        self._maybe_fail()
+        return SimpleNamespace(text="A benchmark answer. " * self.chunks)
+
+    def _stream(self):
+        for _ in range(self.chunks):
+            time.sleep(jitter(self.latency) / self.chunks)
+            self._maybe_fail()
+            yield SimpleNamespace(text="A benchmark answer. ")
+
+    def _maybe_fail(self):
+        if random.random() < self.error_rate:
+            raise RuntimeError("503 injected Gemini failure")
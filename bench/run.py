@@ -0,0 +1,321 @@
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import httpx
+from bench import fakes
+
+# ------------------------- Config -------------------------
+# Offline load test: starts the fake upstreams (bench/fakes.py), points the
+# bot at them through TELEGRAM_API_URL / UPSTREAM_URL_<NAME>, swaps Gemini for
+# a fake model and feeds synthetic updates through the update queue of the
+# application that run_bot() runs. Reports updates/sec, per-command p50/p99 and RSS growth, and
+# exits non-zero when a --min-rate / --max-p99 / --max-memory-growth /
+# --max-errors threshold is missed, so CI can gate on it. The media feature
+# stays disabled by default: gTTS and Google speech recognition call out
+# directly rather than through http_client, so they have no fake.
+#
+#   python -m bench.run --updates 5000 --concurrency 64 --latency 20,gemini=500 --errors 0.01
+COMMANDS = {
+    # command -> (feature, text generator)
+    "chat": ("ai", lambda rng: f"/chat {rng.choice(QUESTIONS)}"),
+    "weather": ("weather", lambda rng: f"/weather {rng.choice(CITIES)}"),
+    "news": ("news", lambda rng: "/news"),
+    "fun": ("fun", lambda rng: "/fun"),
+    "trivia": ("trivia", lambda rng: "/trivia"),
+    "price": ("finance", lambda rng: "/price " + " ".join(rng.sample(SYMBOLS, 3))),
+    "remind": ("reminders", lambda rng: f"/remind {rng.randint(30, 600)} stretch"),
+    "help": (None, lambda rng: "/help"),
+    "text": (None, lambda rng: "hello there"),
+}
+DEFAULT_MIX = "chat=3,weather=3,news=2,fun=2,trivia=2,price=2,remind=1,help=1,text=1"
+QUESTIONS = ["What is a black hole?", "Explain recursion", "Best way to learn Python?",
+             "Why is the sky blue?", "Summarize the French revolution", "How do vaccines work?"]
+CITIES = ["London", "Paris", "Tokyo", "Delhi", "New York", "Berlin", "Sydney", "Cairo", "Lima", "Oslo"]
+SYMBOLS = ["BTC", "ETH", "SOL", "DOGE", "AAPL", "MSFT", "TSLA", "$COIN", "NVDA", "ADA"]
+USER_ID_BASE = 10_000_000
+
+
+# ------------------------- Synthetic updates -------------------------
+def parse_spec(text, scale=1.0):
+    # "20,gemini=500" -> {"telegram": 20 * scale, ..., "gemini": 500 * scale}
+    default, overrides = 0.0, {}
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        name, _, value = part.rpartition("=")
+        if name:
+            overrides[name] = float(value) * scale
+        else:
+            default = float(value) * scale
+    return {name: overrides.get(name, default) for name in fakes.UPSTREAMS + ("gemini",)}
+
+
+def parse_mix(text, enabled):
+    mix = {}
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in COMMANDS:
+            raise SystemExit(f"Unknown command in --mix: {name} (choose from {', '.join(COMMANDS)})")
+        feature = COMMANDS[name][0]
+        if feature is None or enabled(feature):
+            mix[name] = float(weight or 1)
+    return mix
+
+
+def make_update(update_id, user_id, text):
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": "Bench"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "language_code": "en"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def synthetic_updates(count, users, mix, seed=0):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    for update_id in range(1, count + 1):
+        name = rng.choices(names, weights)[0]
+        yield make_update(update_id, USER_ID_BASE + rng.randrange(users), COMMANDS[name][1](rng))
+
+
+def command_of(data):
+    text = (data.get("message") or {}).get("text") or ""
+    if text.startswith("/"):
+        return text.split()[0][1:].split("@")[0]
+    return "text" if text else "other"
+
+
+# ------------------------- Replay -------------------------
+async def replay(application, updates, concurrency, rate=0):
+    # Updates go through application.update_queue, so the update processor
+    # run_bot() configures decides what runs concurrently, as under polling.
+    # Closed loop (rate=0): keep `concurrency` updates in flight, latency is
+    # measured per update. Open loop: updates arrive at `rate` per second and
+    # latency counts from the scheduled arrival, queueing included.
+    from telegram import Update
+    slots = asyncio.Semaphore(concurrency)
+    samples = {}  # command -> [seconds]
+    arrivals = {}  # update_id -> (command, arrival)
+    processor = application.update_processor
+    process = processor.do_process_update
+
+    async def timed(update, coroutine):
+        try:
+            await process(update, coroutine)
+        finally:
+            command, arrival = arrivals.pop(update.update_id)
+            samples.setdefault(command, []).append(time.perf_counter() - arrival)
+            slots.release()
+
+    processor.do_process_update = timed
+    try:
+        started = time.perf_counter()
+        for i, data in enumerate(updates):
+            arrival = time.perf_counter()
+            if rate:
+                arrival = started + i / rate
+                await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            await slots.acquire()
+            arrivals[data["update_id"]] = (command_of(data), arrival)
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await application.update_queue.join()
+    finally:
+        del processor.do_process_update
+    return samples, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource  # peak, not current, but the best there is off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def handler_errors(metrics):
+    errors = {}
+    for key, value in metrics.commands_total.values.items():
+        labels = dict(key)
+        if labels.get("outcome") == "error":
+            errors[labels["command"]] = value
+    return errors
+
+
+# ------------------------- Run -------------------------
+def configure_env(args, base_url, data_dir):
+    # Everything the bot could reach is pointed at the fakes, so a .env with
+    # real keys or URLs never turns the benchmark into live traffic
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "123456:bench",
+        "TELEGRAM_API_URL": f"{base_url}/telegram",
+        "OPENWEATHER_API_KEY": "bench",
+        "NEWS_API_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "HF_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        "STATE_STORE_URL": args.store or "",
+        "DISABLED_FEATURES": args.disable,
+        "RATE_LIMITS": "on" if args.rate_limits else "off",
+        "METRICS_PORT": "",
+        "BOT_MODE": "polling",
+    })
+    for upstream in fakes.UPSTREAMS:
+        if upstream != "telegram":
+            os.environ[f"UPSTREAM_URL_{upstream.upper()}"] = f"{base_url}/{upstream}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+async def run(args, base_url, latency, errors):
+    import bot  # reads its settings from the environment configured above
+    import metrics
+    import registry
+    if registry.enabled("ai"):
+        import modules.ai
+        modules.ai._model = fakes.FakeModel(latency["gemini"], errors["gemini"])
+
+    if args.replay:
+        with open(args.replay) as replay_file:
+            updates = [json.loads(line) for line in replay_file if line.strip()]
+    else:
+        mix = parse_mix(args.mix, registry.enabled)
+        updates = list(synthetic_updates(args.warmup + args.updates, args.users, mix, args.seed))
+    warmup, measured = updates[:args.warmup], updates[args.warmup:]
+
+    application = bot.build_app()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        await replay(application, warmup, args.concurrency)
+        gc.collect()
+        errors_before = handler_errors(metrics)
+        rss_before = rss_bytes()
+        samples, elapsed = await replay(application, measured, args.concurrency, args.rate)
+        gc.collect()
+        rss_after = rss_bytes()
+        errors_after = handler_errors(metrics)
+    finally:
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+
+    async with httpx.AsyncClient() as client:
+        upstreams = (await client.get(f"{base_url}/_stats")).json()
+    all_samples = [value for values in samples.values() for value in values]
+    return {
+        "updates": len(measured),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(measured) / elapsed, 1) if elapsed else 0.0,
+        "concurrency": args.concurrency,
+        "p50_ms": round(percentile(all_samples, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(all_samples, 0.99) * 1000, 1),
+        "commands": {
+            command: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+                "errors": errors_after.get(command, 0) - errors_before.get(command, 0),
+            }
+            for command, values in sorted(samples.items())
+        },
+        "rss_before_mb": round(rss_before / 2 ** 20, 1),
+        "rss_after_mb": round(rss_after / 2 ** 20, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / 2 ** 20, 1),
+        "upstreams": upstreams["upstreams"],
+        "telegram_methods": upstreams["telegram_methods"],
+    }
+
+
+def print_report(report):
+    print(f"{report['updates']} updates in {report['seconds']}s -> {report['updates_per_second']} updates/s "
+          f"(concurrency {report['concurrency']}, p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms)")
+    print(f"\n{'command':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for command, row in report["commands"].items():
+        print(f"{command:<12}{row['count']:>8}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}{row['errors']:>8}")
+    print(f"\nmemory: RSS {report['rss_before_mb']} MB -> {report['rss_after_mb']} MB ({report['rss_growth_mb']:+} MB)")
+    print("upstreams: " + ", ".join(f"{name} {row['requests']} ({row['errors']} failed)"
+                                    for name, row in report["upstreams"].items() if row["requests"]))
+
+
+def check_thresholds(report, args):
+    failures = []
+    if args.min_rate is not None and report["updates_per_second"] < args.min_rate:
+        failures.append(f"throughput {report['updates_per_second']} updates/s < {args.min_rate}")
+    if args.max_p99 is not None and report["p99_ms"] > args.max_p99:
+        failures.append(f"p99 {report['p99_ms']} ms > {args.max_p99} ms")
+    if args.max_memory_growth is not None and report["rss_growth_mb"] > args.max_memory_growth:
+        failures.append(f"RSS growth {report['rss_growth_mb']} MB > {args.max_memory_growth} MB")
+    errors = sum(row["errors"] for row in report["commands"].values())
+    if args.max_errors is not None and errors > args.max_errors:
+        failures.append(f"{errors} handler errors > {args.max_errors}")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against fake Telegram and upstream APIs")
+    parser.add_argument("--updates", type=int, default=2000, help="measured updates")
+    parser.add_argument("--warmup", type=int, default=200, help="updates replayed before measuring")
+    parser.add_argument("--concurrency", type=int, default=64, help="updates in flight")
+    parser.add_argument("--rate", type=float, default=0, help="open loop arrivals per second (0: closed loop)")
+    parser.add_argument("--users", type=int, default=1000, help="distinct users/chats")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="command weights, e.g. chat=3,weather=1")
+    parser.add_argument("--replay", help="JSON lines of recorded updates to replay instead of synthetic ones")
+    parser.add_argument("--latency", default="20,gemini=500", help="upstream latency in ms, e.g. 20,telegram=50")
+    parser.add_argument("--errors", default="0", help="upstream error rates, e.g. 0.01,coingecko=0.2")
+    parser.add_argument("--disable", default="image,media", help="DISABLED_FEATURES for the run")
+    parser.add_argument("--store", help="STATE_STORE_URL (default: the benchmark's SQLite file)")
+    parser.add_argument("--rate-limits", action="store_true", help="keep per-user limits and flood pacing on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report as JSON to this file ('-' for stdout only)")
+    parser.add_argument("--min-rate", type=float, help="fail below this many updates/s")
+    parser.add_argument("--max-p99", type=float, help="fail above this overall p99 in ms")
+    parser.add_argument("--max-memory-growth", type=float, help="fail above this RSS growth in MB")
+    parser.add_argument("--max-errors", type=int, help="fail above this many handler errors")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    latency, errors = parse_spec(args.latency, 0.001), parse_spec(args.errors)
+    process, base_url = fakes.start(latency, errors)
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            configure_env(args, base_url, data_dir)
+            report = asyncio.run(run(args, base_url, latency, errors))
+    finally:
+        process.terminate()
+        process.join()
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import time
+import asyncio
+import logging
+from telegram.error import Forbidden, BadRequest, RetryAfter
+import db
+from ratelimit import TokenBuckets, shard_share
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Broadcasts -------------------------
+# A broadcast sends one of a few prepared texts to many chats. The texts and
+# the list of pending deliveries are written to SQLite before the first
+# message goes out and each delivery row is deleted once it is sent, so a
+# broadcast interrupted by a restart resumes where it stopped (a message that
+# was in flight at the crash may be sent twice).
+#
+# Sends go through the bot, so the OutboundLimiter's global and per-chat
+# limits still apply; on top of that broadcasts take at most BROADCAST_RATE
+# messages per second, leaving the rest of the global budget for replies.
+# Like the global budget it is split between shards (see ratelimit.py), so
+# the broadcasting shard keeps the same share of its own slice.
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 20))
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30
+
+
+def init_broadcasts():
+    conn = db.connect()
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS broadcast_texts (
+            broadcast_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (broadcast_id, key)
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS broadcast_queue (
+            broadcast_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_at REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (broadcast_id, chat_id, key)
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS broadcast_queue_next ON broadcast_queue (broadcast_id, next_at)")
+
+
+def create(name, texts, recipients_sql, params=()):
+    # texts: {key: text}. recipients_sql selects (chat_id, key) rows; only keys
+    # with a text are queued. Returns the broadcast id, or None if a broadcast
+    # with this name already exists.
+    init_broadcasts()
+    conn = db.connect()
+    conn.execute("BEGIN")
+    try:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO broadcasts (name, created_at) VALUES (?, ?)", (name, time.time())
+        )
+        if cursor.rowcount == 0:
+            conn.execute("ROLLBACK")
+            return None
+        broadcast_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO broadcast_texts (broadcast_id, key, text) VALUES (?, ?, ?)",
+            [(broadcast_id, key, text) for key, text in texts.items()],
+        )
+        conn.execute(
+            f"""INSERT OR IGNORE INTO broadcast_queue (broadcast_id, chat_id, key)
+                SELECT ?, r.chat_id, r.key FROM ({recipients_sql}) r
+                JOIN broadcast_texts t ON t.broadcast_id = ? AND t.key = r.key""",
+            (broadcast_id, *params, broadcast_id),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return broadcast_id
+
+
+def exists(name):
+    init_broadcasts()
+    return db.connect().execute("SELECT 1 FROM broadcasts WHERE name = ?", (name,)).fetchone() is not None
+
+
+def unfinished():
+    init_broadcasts()
+    rows = db.connect().execute("SELECT id FROM broadcasts WHERE finished_at IS NULL ORDER BY id").fetchall()
+    return [broadcast_id for (broadcast_id,) in rows]
+
+
+def progress(broadcast_id):
+    row = db.connect().execute(
+        "SELECT COUNT(*) FROM broadcast_queue WHERE broadcast_id = ?", (broadcast_id,)
+    ).fetchone()
+    return row[0]
+
+
+class Broadcaster:
+    def __init__(self, rate=BROADCAST_RATE, batch_size=BATCH_SIZE, on_blocked=None):
+        self.batch_size = batch_size
+        self.on_blocked = on_blocked  # called with chat ids that blocked the bot
+        self.rate = rate
+        self._sends = None  # built on first delivery, once the shard count is known
+
+    async def deliver(self, bot, broadcast_id):
+        # Sends everything still queued for the broadcast, then marks it finished
+        if self._sends is None:
+            self._sends = TokenBuckets(*shard_share((self.rate, self.rate)))
+        conn = db.connect()
+        texts = dict(conn.execute(
+            "SELECT key, text FROM broadcast_texts WHERE broadcast_id = ?", (broadcast_id,)
+        ).fetchall())
+        while True:
+            now = time.time()
+            batch = conn.execute(
+                """SELECT chat_id, key, attempts FROM broadcast_queue
+                   WHERE broadcast_id = ? AND next_at <= ? ORDER BY next_at LIMIT ?""",
+                (broadcast_id, now, self.batch_size),
+            ).fetchall()
+            if batch:
+                await self._send_batch(conn, bot, broadcast_id, texts, batch)
+                continue
+            row = conn.execute(
+                "SELECT MIN(next_at) FROM broadcast_queue WHERE broadcast_id = ?", (broadcast_id,)
+            ).fetchone()
+            if row[0] is None:
+                break
+            await asyncio.sleep(max(0.0, row[0] - now))
+        conn.execute("UPDATE broadcasts SET finished_at = ? WHERE id = ?", (time.time(), broadcast_id))
+        conn.execute("DELETE FROM broadcast_texts WHERE broadcast_id = ?", (broadcast_id,))
+        logger.info("Broadcast %s finished", broadcast_id)
+
+    async def _send_batch(self, conn, bot, broadcast_id, texts, batch):
+        # Tokens are taken one by one here, so sends start at a steady pace
+        # instead of all waking up together
+        tasks = []
+        try:
+            for chat_id, key, _ in batch:
+                await self._sends.acquire("broadcast")
+                tasks.append(asyncio.ensure_future(bot.send_message(chat_id=chat_id, text=texts[key])))
+        finally:
+            # On shutdown, record what was already sent so it isn't sent again
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            self._record(conn, broadcast_id, batch[:len(tasks)], results)
+
+    def _record(self, conn, broadcast_id, batch, results):
+        done, retry, blocked = [], [], []
+        for (chat_id, key, attempts), result in zip(batch, results):
+            if isinstance(result, Forbidden):
+                blocked.append(chat_id)
+            # Blocked chats and bad requests won't succeed on a retry
+            failed = isinstance(result, Exception) and not isinstance(result, (Forbidden, BadRequest))
+            if not failed or attempts + 1 >= MAX_ATTEMPTS:
+                done.append((broadcast_id, chat_id, key))
+                continue
+            # 429s that outlasted the limiter's own retry wait for Telegram's retry_after
+            delay = RETRY_DELAY
+            if isinstance(result, RetryAfter):
+                retry_after = result.retry_after
+                delay = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after
+            retry.append((time.time() + delay, broadcast_id, chat_id, key))
+        conn.execute("BEGIN")
+        conn.executemany("DELETE FROM broadcast_queue WHERE broadcast_id = ? AND chat_id = ? AND key = ?", done)
+        conn.executemany(
+            """UPDATE broadcast_queue SET next_at = ?, attempts = attempts + 1
+               WHERE broadcast_id = ? AND chat_id = ? AND key = ?""",
+            retry,
+        )
+        conn.execute("COMMIT")
+        if blocked and self.on_blocked:
+            self.on_blocked(blocked)
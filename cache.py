@@ -0,0 +1,180 @@
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from collections import OrderedDict
+import metrics
+
+# ------------------------- Config -------------------------
+# source -> seconds an entry is fresh. After that it's still served for
+# STALE_TTL seconds while a background refresh fetches a new value.
+TTLS = {
+    "weather": 600,
+    "news": 900,
+    "crypto": 60,
+    "stock": 60,
+}
+STALE_TTL = int(os.getenv("CACHE_STALE_TTL", 300))
+# Past that, an expired entry is kept as the last known good value: if the
+# upstream fails (or its circuit is open) it is served instead of an error
+# for up to LAST_GOOD_TTL seconds, and fallback_age() tells the caller how old it is
+LAST_GOOD_TTL = int(os.getenv("CACHE_LAST_GOOD_TTL", 24 * 3600))
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+
+
+# ------------------------- Backend -------------------------
+class MemoryCache:
+    # Bounded LRU of key -> (value, stored_at). Any object with the same
+    # get/set/delete/__len__ methods can be plugged in via set_backend().
+    # With max_bytes set, values must support len() and the total size of
+    # stored values is capped as well.
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def set(self, key, value):
+        if self.max_bytes is not None:
+            if len(value) > self.max_bytes:
+                return
+            self.delete(key)
+            self.size_bytes += len(value)
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries or (
+            self.max_bytes is not None and self.size_bytes > self.max_bytes
+        ):
+            _, (evicted, _) = self._data.popitem(last=False)
+            if self.max_bytes is not None:
+                self.size_bytes -= len(evicted)
+
+    def delete(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None and self.max_bytes is not None:
+            self.size_bytes -= len(entry[0])
+
+    def __len__(self):
+        return len(self._data)
+
+
+_backend_factory = MemoryCache
+_caches = {}
+_stats = {}
+_refreshing = {}
+
+
+def set_backend(factory):
+    global _backend_factory
+    _backend_factory = factory
+    _caches.clear()
+
+
+def get_cache(source):
+    if source not in _caches:
+        _caches[source] = _backend_factory()
+        _stats.setdefault(source, {"hits": 0, "stale_hits": 0, "misses": 0, "fallbacks": 0})
+    return _caches[source]
+
+
+def stats():
+    result = {}
+    for source, counters in _stats.items():
+        total = counters["hits"] + counters["stale_hits"] + counters["misses"]
+        hit_ratio = (counters["hits"] + counters["stale_hits"]) / total if total else 0.0
+        result[source] = dict(counters, size=len(get_cache(source)), hit_ratio=round(hit_ratio, 3))
+    return result
+
+
+metrics.stats_collector("cache", stats, label="source")
+
+
+# ------------------------- Keys -------------------------
+def normalize_text(text):
+    return " ".join(str(text).lower().split())
+
+
+def normalize_city(city, *args, **kwargs):
+    # "London", " london ", "London,GB" -> "london"
+    return normalize_text(city.split(",")[0])
+
+
+# ------------------------- Decorator -------------------------
+_fallback_age = contextvars.ContextVar("cache_fallback_age", default=None)
+
+
+def fallback_age():
+    # Age in seconds of the last known good value the latest cached call in
+    # this task fell back to, or None if it returned a live value
+    return _fallback_age.get()
+
+
+def cached(source, key=None):
+    # Cache the result of an async fetcher. None results are not cached and
+    # exceptions propagate, so failed lookups are retried on the next call,
+    # unless a last known good value can be served instead.
+    ttl = TTLS.get(source, 300)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else normalize_text(args)
+            cache = get_cache(source)
+            counters = _stats[source]
+            _fallback_age.set(None)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < ttl:
+                    counters["hits"] += 1
+                    return value
+                if age < ttl + STALE_TTL:
+                    counters["stale_hits"] += 1
+                    _refresh_later(source, cache_key, fn, args, kwargs)
+                    return value
+                if age >= LAST_GOOD_TTL:
+                    cache.delete(cache_key)
+                    entry = None
+
+            counters["misses"] += 1
+            try:
+                value = await fn(*args, **kwargs)
+            except Exception:
+                if entry is None:
+                    raise
+                counters["fallbacks"] += 1
+                _fallback_age.set(time.monotonic() - entry[1])
+                return entry[0]
+            if value is not None:
+                cache.set(cache_key, value)
+            return value
+
+        wrapper.uncached = fn
+        return wrapper
+
+    return decorator
+
+
+def _refresh_later(source, cache_key, fn, args, kwargs):
+    if (source, cache_key) in _refreshing:
+        return
+
+    async def refresh():
+        try:
+            value = await fn(*args, **kwargs)
+            if value is not None:
+                get_cache(source).set(cache_key, value)
+        except Exception:
+            pass  # keep serving the stale value until it expires
+        finally:
+            _refreshing.pop((source, cache_key), None)
+
+    _refreshing[(source, cache_key)] = asyncio.get_running_loop().create_task(refresh())
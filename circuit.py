@@ -0,0 +1,184 @@
+import os
+import time
+import logging
+import contextlib
+from collections import deque
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Config -------------------------
+# One breaker per upstream, fed by http_client (and by the Gemini calls in
+# modules.ai). It opens when at least MIN_CALLS calls finished in the last
+# WINDOW seconds and FAILURE_RATE of them failed (timeout, connection error,
+# 5xx or 429). While open, calls fail at once with CircuitOpen instead of
+# queueing behind a dead provider. After OPEN_SECONDS up to HALF_OPEN_CALLS
+# probes are let through: if they all succeed the breaker closes, if one
+# fails it opens again for twice as long (up to MAX_OPEN_SECONDS).
+WINDOW = int(os.getenv("BREAKER_WINDOW", 30))
+MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 15))
+MAX_OPEN_SECONDS = float(os.getenv("BREAKER_MAX_OPEN_SECONDS", 120))
+HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", 2))
+# Hugging Face answers 503 while a model loads; the image queue retries those itself
+IGNORED_STATUSES = {"huggingface": {503}}
+
+STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpen(Exception):
+    def __init__(self, upstream, retry_in):
+        super().__init__(f"{upstream} is temporarily unavailable (retry in {int(retry_in) + 1}s)")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+# ------------------------- Breaker -------------------------
+class CircuitBreaker:
+    def __init__(self, name, window=WINDOW, min_calls=MIN_CALLS, failure_rate=FAILURE_RATE,
+                 open_seconds=OPEN_SECONDS, max_open_seconds=MAX_OPEN_SECONDS, half_open_calls=HALF_OPEN_CALLS):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = "closed"
+        self.open_for = open_seconds
+        self.opened_at = 0.0
+        self.round = 0  # half-open rounds so far; a probe's token
+        self.probes = 0  # probes let through while half open
+        self.probe_successes = 0
+        self.rejected = 0
+        self._buckets = deque()  # [second, calls, failures], oldest first
+
+    def allow(self, now=None):
+        # Raises CircuitOpen unless a call may go out now. Returns the probe
+        # token to hand back to record()/release(): the current half-open round
+        # for a probe, None for an ordinary call.
+        now = time.monotonic() if now is None else now
+        if self.state == "open":
+            retry_in = self.opened_at + self.open_for - now
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpen(self.name, retry_in)
+            self._transition("half_open")
+            self.round += 1
+            self.probes = self.probe_successes = 0
+        if self.state == "half_open":
+            if self.probes >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpen(self.name, 1)
+            self.probes += 1
+            return self.round
+        return None
+
+    def record(self, ok, now=None, probe=None):
+        now = time.monotonic() if now is None else now
+        if self.state == "half_open":
+            # Calls that went out before the breaker opened, or probes from an
+            # earlier round, say nothing about the upstream's recovery
+            if probe != self.round:
+                return
+            if not ok:
+                self._open(now, min(self.max_open_seconds, self.open_for * 2))
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_calls:
+                self._buckets.clear()
+                self.open_for = self.open_seconds
+                self._transition("closed")
+            return
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][1] += 1
+        self._buckets[-1][2] += not ok
+        if self.state == "closed" and not ok:
+            calls, failures = self.counts(now)
+            if calls >= self.min_calls and failures >= calls * self.failure_rate:
+                self._open(now, self.open_seconds)
+
+    def release(self, probe=None):
+        # A probe that ended without an outcome (cancelled) frees its slot
+        if self.state == "half_open" and probe == self.round and self.probes > self.probe_successes:
+            self.probes -= 1
+
+    def counts(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        return sum(bucket[1] for bucket in self._buckets), sum(bucket[2] for bucket in self._buckets)
+
+    def _open(self, now, open_for):
+        self.opened_at = now
+        self.open_for = open_for
+        self._transition("open")
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.warning("Circuit for %s: %s -> %s", self.name, self.state, state,
+                           extra={"upstream": self.name})
+            self.state = state
+
+    def stats(self):
+        calls, failures = self.counts()
+        return {"state": STATES[self.state], "calls": calls, "failures": failures, "rejected": self.rejected}
+
+
+_breakers = {}
+
+
+def get_breaker(upstream):
+    breaker = _breakers.get(upstream)
+    if breaker is None:
+        breaker = _breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+
+def is_open(upstream):
+    breaker = _breakers.get(upstream)
+    return breaker is not None and breaker.state != "closed"
+
+
+def stats():
+    return {upstream: breaker.stats() for upstream, breaker in _breakers.items()}
+
+
+metrics.stats_collector("circuit", stats, label="upstream")
+
+
+# ------------------------- Guard -------------------------
+class _Guard:
+    __slots__ = ("ok", "ignored")
+
+    def __init__(self, ignored):
+        self.ok = True
+        self.ignored = ignored
+
+    def status(self, code):
+        if (code >= 500 or code == 429) and code not in self.ignored:
+            self.ok = False
+
+
+@contextlib.contextmanager
+def guard(upstream, ignore=()):
+    # with guard("newsapi") as call: response = ...; call.status(response.status_code)
+    # Exceptions in ignore (e.g. a local pool being full) don't count either way.
+    breaker = get_breaker(upstream)
+    probe = breaker.allow()
+    call = _Guard(IGNORED_STATUSES.get(upstream, ()))
+    try:
+        yield call
+    except ignore:
+        breaker.release(probe)
+        raise
+    except Exception:
+        breaker.record(False, probe=probe)
+        raise
+    except BaseException:
+        breaker.release(probe)
+        raise
+    breaker.record(call.ok, probe=probe)
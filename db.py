@@ -0,0 +1,36 @@
+import os
+import sqlite3
+
+# ------------------------- SQLite connection -------------------------
+# One shared connection for the whole bot, opened lazily from DATABASE_URL
+# (only sqlite:///path URLs are supported).
+_conn = None
+
+
+def get_db_path():
+    url = os.getenv("DATABASE_URL", "sqlite:///ryzex.db")
+    if not url.startswith("sqlite:///"):
+        raise ValueError(f"Unsupported DATABASE_URL: {url}")
+    return url[len("sqlite:///"):]
+
+
+def open_db(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    # WAL lets several bot processes read and write the same file
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def connect():
+    global _conn
+    if _conn is None:
+        _conn = open_db(get_db_path())
+    return _conn
+
+
+def close():
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
@@ -0,0 +1,96 @@
+import os
+import asyncio
+import httpx
+import circuit
+import metrics
+
+# ------------------------- Upstream config -------------------------
+# Every upstream gets its own keep-alive pool, timeout and concurrency cap so
+# one slow provider can't eat the connections or the patience of the others.
+# Override per upstream from the environment, e.g. HTTP_TIMEOUT_OPENWEATHER=5,
+# HTTP_CONCURRENCY_HUGGINGFACE=2 or UPSTREAM_URL_NEWSAPI=http://localhost:9000
+# Each upstream also has a circuit breaker (see circuit.py): while it is open
+# requests raise CircuitOpen right away instead of waiting for a timeout.
+UPSTREAMS = {
+    "openweather": {"base_url": "http://api.openweathermap.org", "timeout": 10, "concurrency": 20},
+    "newsapi": {"base_url": "https://newsapi.org", "timeout": 10, "concurrency": 10},
+    "uselessfacts": {"base_url": "https://uselessfacts.jsph.pl", "timeout": 5, "concurrency": 10},
+    "opentdb": {"base_url": "https://opentdb.com", "timeout": 10, "concurrency": 5},
+    "coingecko": {"base_url": "https://api.coingecko.com", "timeout": 10, "concurrency": 10},
+    "fmp": {"base_url": "https://financialmodelingprep.com", "timeout": 10, "concurrency": 10},
+    "huggingface": {"base_url": "https://api-inference.huggingface.co", "timeout": 120, "concurrency": 4},
+}
+
+_clients = {}
+_semaphores = {}
+
+
+def _setting(upstream, key):
+    env_prefix = {"base_url": "UPSTREAM_URL", "timeout": "HTTP_TIMEOUT", "concurrency": "HTTP_CONCURRENCY"}[key]
+    value = os.getenv(f"{env_prefix}_{upstream.upper()}")
+    default = UPSTREAMS[upstream][key]
+    if value is None:
+        return default
+    return type(default)(value)
+
+
+async def configure(upstream, **settings):
+    # Change settings at runtime; the pool is rebuilt on next use
+    UPSTREAMS.setdefault(upstream, {}).update(settings)
+    client = _clients.pop(upstream, None)
+    _semaphores.pop(upstream, None)
+    if client is not None:
+        await client.aclose()
+
+
+def get_client(upstream):
+    client = _clients.get(upstream)
+    if client is None:
+        concurrency = _setting(upstream, "concurrency")
+        client = httpx.AsyncClient(
+            base_url=_setting(upstream, "base_url"),
+            timeout=httpx.Timeout(_setting(upstream, "timeout")),
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+                keepalive_expiry=30,
+            ),
+        )
+        _clients[upstream] = client
+        _semaphores[upstream] = asyncio.Semaphore(concurrency)
+    return client
+
+
+# ------------------------- Requests -------------------------
+async def request(upstream, method, path, **kwargs):
+    client = get_client(upstream)
+    # The breaker is checked before queueing for a connection, so calls fail
+    # fast instead of piling up behind a dead provider
+    with circuit.guard(upstream) as breaker:
+        async with _semaphores[upstream]:
+            with metrics.upstream_call(upstream) as call:
+                response = await client.request(method, path, **kwargs)
+                call.status(response.status_code)
+        breaker.status(response.status_code)
+    return response
+
+
+async def get_json(upstream, path, **kwargs):
+    # Server errors and rate limiting raise, so cached fetchers fall back to
+    # their last good value instead of parsing an error body
+    response = await request(upstream, "GET", path, **kwargs)
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return response.json()
+
+
+async def post(upstream, path, **kwargs):
+    return await request(upstream, "POST", path, **kwargs)
+
+
+async def close():
+    clients = list(_clients.values())
+    _clients.clear()
+    _semaphores.clear()
+    for client in clients:
+        await client.aclose()
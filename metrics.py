@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import functools
+import contextlib
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Config -------------------------
+# In-process metrics rendered in the Prometheus text format. They are served
+# on GET /metrics by the webhook server, and on METRICS_PORT by a tiny HTTP
+# listener in any mode (sharded workers use METRICS_PORT + shard index).
+# LOG_FORMAT=json switches logging to one JSON object per line carrying the
+# trace id of the update being handled.
+METRICS_PORT = os.getenv("METRICS_PORT")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LOOP_LAG_INTERVAL = 0.5
+
+trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+# ------------------------- Metric types -------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}  # sorted label items -> value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = {}  # sorted label items -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def samples(self):
+        samples = []
+        for key, entry in self.values.items():
+            for bound, count in zip(self.buckets, entry):
+                samples.append((f"{self.name}_bucket", key + (("le", bound),), count))
+            samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), entry[-1]))
+            samples.append((f"{self.name}_sum", key, round(entry[-2], 6)))
+            samples.append((f"{self.name}_count", key, entry[-1]))
+        return samples
+
+
+_metrics = []
+_collectors = []
+
+
+def counter(name, help):
+    _metrics.append(Counter(name, help))
+    return _metrics[-1]
+
+
+def gauge(name, help):
+    _metrics.append(Gauge(name, help))
+    return _metrics[-1]
+
+
+def histogram(name, help, buckets=BUCKETS):
+    _metrics.append(Histogram(name, help, buckets))
+    return _metrics[-1]
+
+
+def stats_collector(prefix, stats, label=None):
+    # Exposes an existing stats() function as gauges: every numeric field
+    # becomes <prefix>_<field>, labelled by the outer key when stats() returns
+    # {label value: {field: value}}
+    _collectors.append((prefix, stats, label))
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{_labels(key)} {value}" for name, key, value in metric.samples())
+    for prefix, stats, label in _collectors:
+        try:
+            values = stats()
+        except Exception:
+            logger.exception("Collecting %s stats failed", prefix)
+            continue
+        rows = values.items() if label else [(None, values)]
+        seen = set()
+        for outer, fields in rows:
+            for field, value in fields.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{field}"
+                if name not in seen:
+                    lines.append(f"# TYPE {name} gauge")
+                    seen.add(name)
+                lines.append(f"{name}{_labels(((label, outer),) if label else ())} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------- Instruments -------------------------
+command_duration = histogram("bot_command_duration_seconds", "Time spent handling a command or button")
+commands_total = counter("bot_commands_total", "Handled commands by outcome")
+in_flight = gauge("bot_handlers_in_flight", "Handlers currently running")
+upstream_duration = histogram("upstream_request_duration_seconds", "Upstream call latency")
+first_chunk = histogram("upstream_first_chunk_seconds", "Time to the first chunk of a streamed upstream response")
+upstream_total = counter("upstream_requests_total", "Upstream calls by outcome (ok, http_4xx, http_5xx, error, timeout)")
+fetch_duration = histogram("fetch_duration_seconds", "Fetcher latency, including cache hits")
+loop_lag = gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay")
+loop_lag_histogram = histogram("event_loop_lag_distribution_seconds", "Event loop scheduling delay")
+
+
+def handler(name):
+    # Wraps a Telegram handler: latency histogram, in-flight gauge, outcome
+    # counter and a fresh trace id for everything logged while it runs
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            # Nested handlers (e.g. /start called from the auto-welcome) keep the outer trace
+            token = trace_id.set(trace_id.get() or uuid.uuid4().hex[:16])
+            in_flight.inc(command=name)
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                in_flight.dec(command=name)
+                command_duration.observe(elapsed, command=name)
+                commands_total.inc(command=name, outcome=outcome)
+                logger.info("handled %s", name, extra={"command": name, "outcome": outcome,
+                                                        "duration_ms": round(elapsed * 1000, 1)})
+                trace_id.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+class _Call:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = "ok"
+
+    def status(self, code):
+        if code >= 500:
+            self.outcome = "http_5xx"
+        elif code >= 400:
+            self.outcome = "http_4xx"
+
+
+def _is_timeout(error):
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "Time" in type(error).__name__
+
+
+@contextlib.contextmanager
+def upstream_call(upstream):
+    # with upstream_call("newsapi") as call: response = ...; call.status(response.status_code)
+    call = _Call()
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as error:
+        call.outcome = "timeout" if _is_timeout(error) else "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        upstream_duration.observe(elapsed, upstream=upstream)
+        upstream_total.inc(upstream=upstream, outcome=call.outcome)
+        if call.outcome != "ok":
+            logger.warning("%s call failed: %s", upstream, call.outcome,
+                           extra={"upstream": upstream, "duration_ms": round(elapsed * 1000, 1)})
+
+
+def timed(name):
+    # Latency of a fetcher, whether it hit the cache or the network
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                fetch_duration.observe(time.perf_counter() - started, fetcher=name)
+        return wrapper
+
+    return decorator
+
+
+# ------------------------- Event loop lag -------------------------
+async def watch_loop_lag(interval=LOOP_LAG_INTERVAL):
+    # A sleep that wakes up late means something blocked the loop
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        loop_lag.set(round(lag, 6))
+        loop_lag_histogram.observe(lag)
+
+
+# ------------------------- Exporter -------------------------
+async def _serve_client(reader, writer):
+    try:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass  # skip headers
+        if request.split(b" ")[:2] == [b"GET", b"/metrics"]:
+            status, body = b"200 OK", render().encode()
+        else:
+            status, body = b"404 Not Found", b"not found"
+        writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     + b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+_tasks = []
+
+
+async def start(port=None):
+    # Starts the loop lag probe and, if a port is configured, the /metrics listener
+    _tasks.append(asyncio.get_running_loop().create_task(watch_loop_lag()))
+    port = port or METRICS_PORT
+    if port:
+        port = int(port) + int(os.getenv("SHARD_INDEX", 0))
+        server = await asyncio.start_server(_serve_client, "0.0.0.0", port)
+        _tasks.append(server)
+
+
+async def stop():
+    for task in _tasks:
+        if isinstance(task, asyncio.Task):
+            task.cancel()
+        else:
+            task.close()
+    _tasks.clear()
+
+
+# ------------------------- Logging -------------------------
+class JsonFormatter(logging.Formatter):
+    FIELDS = ("command", "outcome", "duration_ms", "upstream")
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        data.update({field: getattr(record, field) for field in self.FIELDS if hasattr(record, field)})
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TraceFilter(logging.Filter):
+    def filter(self, record):
+        record.trace_id = trace_id.get()
+        return True
+
+
+def setup_logging(log_format=LOG_FORMAT, level=LOG_LEVEL):
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceFilter())
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"))
+    logging.basicConfig(level=level, handlers=[handler])
+    logging.getLogger("httpx").setLevel(logging.WARNING)
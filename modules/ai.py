@@ -1,12 +1,253 @@
 import os
-import google.generativeai as genai
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from telegram import Update
+from telegram.ext import ContextTypes
+import circuit
+import metrics
+import registry
+import workers
+from workers import PoolBusy, BUSY_MESSAGE
+from modules.prompt_cache import prompt_cache
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+MODEL_NAME = os.getenv("GEMINI_MODEL", "models/gemini-2.5-flash")
+_model = None
 
-def ai_response(prompt):
+def get_model():
+    # One long-lived client shared by every handler
+    global _model
+    if _model is None:
+        # Imported on first use: the SDK is slow to import and large in memory
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+# ------------------------- Streaming -------------------------
+TELEGRAM_MAX_LENGTH = 4096
+EDITS_PER_SECOND = float(os.getenv("STREAM_EDITS_PER_SECOND", 1))
+
+# chat_id -> monotonic time of the last edit, shared by all streams in a chat.
+# Entries are never removed while a stream may still need them; they age out
+# after EDIT_MEMORY_SECONDS, long past any edit interval.
+_last_edit = OrderedDict()
+EDIT_MEMORY_SECONDS = 60
+
+async def stream_response(model, prompt):
+    # Yields text chunks as Gemini produces them. The blocking stream is
+    # consumed in the llm pool and handed back to the event loop chunk by
+    # chunk. Only the producer is timed and guarded by the breaker: the
+    # consumer's Telegram edits between chunks are not Gemini's latency.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def produce():
+        started = time.perf_counter()
+        for i, chunk in enumerate(model.generate_content(prompt, stream=True)):
+            if stopped.is_set():
+                break  # the consumer went away; stop pulling from Gemini
+            if i == 0:
+                waited = time.perf_counter() - started
+                loop.call_soon_threadsafe(lambda: metrics.first_chunk.observe(waited, upstream="gemini"))
+            loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+
+    async def generate():
+        with circuit.guard("gemini", ignore=(PoolBusy,)), metrics.upstream_call("gemini"):
+            await workers.run("llm", produce)
+
+    job = asyncio.ensure_future(generate())
+    job.add_done_callback(lambda _: queue.put_nowait(None))
     try:
-        model = genai.GenerativeModel("gemini-pro")
-        response = model.generate_content(prompt)
-        return response.text
+        while True:
+            text = await queue.get()
+            if text is None:
+                break
+            yield text
+        await job  # surface PoolBusy / API errors to the caller
+    finally:
+        if not job.done():
+            stopped.set()
+            job.cancel()
+            # Nobody awaits it any more; retrieve the outcome so it isn't logged as lost
+            job.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+def split_message(text, limit=TELEGRAM_MAX_LENGTH):
+    pages = []
+    while len(text) > limit:
+        # Prefer breaking on a newline, then a space, then hard-cut
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        pages.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    pages.append(text)
+    return pages
+
+class StreamingReply:
+    # Shows a growing answer by editing the bot's reply in place. Edits are
+    # coalesced to EDITS_PER_SECOND per chat and overflow past Telegram's
+    # 4096-character limit continues in a new message.
+    def __init__(self, message, prefix="🤖 AI says:\n", edits_per_second=EDITS_PER_SECOND):
+        self.message = message
+        self.chat_id = message.chat_id
+        self.prefix = prefix
+        self.interval = 1 / edits_per_second
+        self.text = ""
+        self.sent = []  # [(telegram message, text shown)]
+
+    async def feed(self, chunk):
+        self.text += chunk
+        if time.monotonic() - _last_edit.get(self.chat_id, 0) >= self.interval:
+            await self._flush()
+
+    async def finish(self):
+        wait = self.interval - (time.monotonic() - _last_edit.get(self.chat_id, 0))
+        if wait > 0 and self.sent:
+            await asyncio.sleep(wait)
+        await self._flush()
+
+    async def _flush(self):
+        pages = split_message(self.prefix + self.text)
+        for i, page in enumerate(pages):
+            if not page.strip():
+                continue
+            if i < len(self.sent):
+                sent, shown = self.sent[i]
+                if shown != page:
+                    await sent.edit_text(page)
+                    self.sent[i] = (sent, page)
+            else:
+                sent = await self.message.reply_text(page)
+                self.sent.append((sent, page))
+        now = time.monotonic()
+        _last_edit.pop(self.chat_id, None)
+        _last_edit[self.chat_id] = now
+        while _last_edit and now - next(iter(_last_edit.values())) >= EDIT_MEMORY_SECONDS:
+            _last_edit.popitem(last=False)
+
+# ------------------------- Conversation memory -------------------------
+# Each chat keeps its recent turns plus a running summary of older ones.
+# When the estimated prompt size passes CONTEXT_TOKENS the oldest half of the
+# turns is folded into the summary, so context stays bounded.
+CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 2000))
+SESSION_IDLE_SECONDS = int(os.getenv("CHAT_SESSION_IDLE_SECONDS", 1800))
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", 5000))
+
+def estimate_tokens(text):
+    # Rough but cheap: Gemini averages ~4 characters per token for English
+    return len(text) // 4 + 1
+
+class Conversation:
+    __slots__ = ("summary", "turns", "tokens", "last_used")
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = deque()  # (role, text)
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+    def add(self, role, text):
+        self.turns.append((role, text))
+        self.tokens += estimate_tokens(text)
+
+    def contents(self, prompt):
+        contents = []
+        if self.summary:
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far: {self.summary}"]})
+            contents.append({"role": "model", "parts": ["Got it."]})
+        contents.extend({"role": role, "parts": [text]} for role, text in self.turns)
+        contents.append({"role": "user", "parts": [prompt]})
+        return contents
+
+class ConversationStore:
+    def __init__(self, budget=CONTEXT_TOKENS, idle_seconds=SESSION_IDLE_SECONDS, max_sessions=MAX_SESSIONS):
+        self.budget = budget
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # chat_id -> Conversation, least recently used first
+
+    def get(self, chat_id):
+        self._evict()
+        conversation = self._sessions.pop(chat_id, None) or Conversation()
+        conversation.last_used = time.monotonic()
+        self._sessions[chat_id] = conversation
+        return conversation
+
+    def reset(self, chat_id):
+        self._sessions.pop(chat_id, None)
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            chat_id, oldest = next(iter(self._sessions.items()))
+            if oldest.last_used >= cutoff and len(self._sessions) < self.max_sessions:
+                break
+            del self._sessions[chat_id]
+
+    async def compact(self, conversation, model=None):
+        if conversation.tokens + estimate_tokens(conversation.summary) <= self.budget:
+            return
+        old = [conversation.turns.popleft() for _ in range(max(1, len(conversation.turns) // 2))]
+        conversation.tokens -= sum(estimate_tokens(text) for _, text in old)
+        transcript = "\n".join(f"{role}: {text}" for role, text in old)
+        prompt = (
+            "Summarize this conversation in a few sentences, keeping names, facts and open questions.\n\n"
+            f"Earlier summary: {conversation.summary}\n\n{transcript}"
+        )
+        try:
+            response = await workers.run("llm", (model or get_model()).generate_content, prompt)
+            conversation.summary = response.text[: self.budget * 2]
+        except Exception:
+            pass  # the old turns are dropped either way; memory stays bounded
+
+    def __len__(self):
+        return len(self._sessions)
+
+conversations = ConversationStore()
+
+# ------------------------- Commands -------------------------
+@registry.command("chat", "/chat <message> → Ask AI")
+async def chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = " ".join(context.args)
+    if not query:
+        await update.message.reply_text("❌ Provide a message!")
+        return
+    await answer_chat(update.message, update.effective_chat.id, query)
+
+async def answer_chat(message, chat_id, query):
+    try:
+        conversation = conversations.get(chat_id)
+        # Only fresh conversations can share answers; follow-ups depend on history
+        cacheable = not conversation.turns and not conversation.summary
+        cached_answer = prompt_cache.lookup(query) if cacheable else None
+        reply = StreamingReply(message)
+        if cached_answer is not None:
+            await reply.feed(cached_answer)
+        else:
+            started = time.monotonic()
+            async for chunk in stream_response(get_model(), conversation.contents(query)):
+                await reply.feed(chunk)
+            if cacheable and reply.text:
+                prompt_cache.store(query, reply.text, time.monotonic() - started)
+        await reply.finish()
+        conversation.add("user", query)
+        conversation.add("model", reply.text)
+        await conversations.compact(conversation)
+    except PoolBusy:
+        await message.reply_text(BUSY_MESSAGE)
     except Exception as e:
-        return f"⚠️ AI Error: {e}"
+        await message.reply_text(f"⚠️ Gemini API error: {e}")
+
+@registry.command("reset", "/reset → Clear AI chat history")
+async def reset_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    conversations.reset(update.effective_chat.id)
+    await update.message.reply_text("🧹 Chat history cleared.")
+
+@registry.button("🤖 Chat", "chat")
+async def chat_button(query):
+    await query.message.reply_text("💬 Type /chat <your message> to ask AI anything.")
@@ -0,0 +1,194 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from telegram import Update
+from telegram.ext import ContextTypes
+import db
+import registry
+import broadcast
+from cache import normalize_city
+from utils import fetch_weather, get_headlines, format_news
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Subscriptions -------------------------
+# Daily weather/news digests. Every chat can subscribe to one city and one
+# news category. Once a day at DIGEST_HOUR (UTC) each distinct city and
+# category is fetched once, and the texts are fanned out to the subscribers
+# as one resumable broadcast.
+DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", 7))
+ERROR_DELAY = 60  # pause after a failed pass before trying again
+NEWS_CATEGORIES = ("business", "entertainment", "general", "health", "science", "sports", "technology")
+
+
+def init_subscriptions():
+    conn = db.connect()
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS subscriptions (
+            chat_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (chat_id, kind)
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS subscriptions_key ON subscriptions (kind, key)")
+
+
+def subscribe(chat_id, kind, key):
+    init_subscriptions()
+    key = normalize_city(key) if kind == "weather" else key.lower()
+    db.connect().execute(
+        "INSERT OR REPLACE INTO subscriptions (chat_id, kind, key) VALUES (?, ?, ?)", (chat_id, kind, key)
+    )
+    return key
+
+
+def unsubscribe(chat_id, kind=None):
+    init_subscriptions()
+    if kind is None:
+        cursor = db.connect().execute("DELETE FROM subscriptions WHERE chat_id = ?", (chat_id,))
+    else:
+        cursor = db.connect().execute(
+            "DELETE FROM subscriptions WHERE chat_id = ? AND kind = ?", (chat_id, kind)
+        )
+    return cursor.rowcount > 0
+
+
+def unsubscribe_many(chat_ids):
+    # Chats that blocked the bot are dropped for good
+    conn = db.connect()
+    conn.execute("BEGIN")
+    conn.executemany("DELETE FROM subscriptions WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+    conn.execute("COMMIT")
+
+
+def subscriptions(chat_id):
+    init_subscriptions()
+    return db.connect().execute(
+        "SELECT kind, key FROM subscriptions WHERE chat_id = ? ORDER BY kind", (chat_id,)
+    ).fetchall()
+
+
+# ------------------------- Digest texts -------------------------
+async def build_texts():
+    # One text per distinct (kind, key); keys whose fetch fails are skipped
+    keys = db.connect().execute("SELECT DISTINCT kind, key FROM subscriptions").fetchall()
+
+    async def build(kind, key):
+        try:
+            if kind == "weather":
+                text = await fetch_weather(key.title(), os.getenv("OPENWEATHER_API_KEY"))
+            else:
+                articles = await get_headlines(os.getenv("NEWS_API_KEY"), key)
+                text = format_news(articles, key) if articles else None
+        except Exception:
+            logger.exception("Digest for %s:%s failed", kind, key)
+            text = None
+        return f"{kind}:{key}", text and f"☀️ Your daily digest\n\n{text}"
+
+    return {key: text for key, text in await asyncio.gather(*[build(kind, key) for kind, key in keys]) if text}
+
+
+# ------------------------- Scheduler -------------------------
+class DigestScheduler:
+    # Runs in one process only. Every pass first finishes any broadcast left
+    # unfinished by a restart or a failed pass, then sends today's digest if
+    # its hour has passed; broadcast names are per day, so a digest never
+    # goes out twice on the same day. A failed pass is retried after
+    # ERROR_DELAY seconds.
+    def __init__(self, hour=DIGEST_HOUR):
+        self.hour = hour
+        self.bot = None
+        self.broadcaster = broadcast.Broadcaster(on_blocked=unsubscribe_many)
+        self._task = None
+
+    def start(self, bot):
+        init_subscriptions()
+        broadcast.init_broadcasts()
+        self.bot = bot
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                delay = await self.tick()
+            except Exception:
+                logger.exception("Digest pass failed")
+                conn = db.connect()
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                delay = ERROR_DELAY
+            await asyncio.sleep(delay)
+
+    async def tick(self, now=None):
+        # Returns seconds until the next pass is needed
+        for broadcast_id in broadcast.unfinished():
+            await self.broadcaster.deliver(self.bot, broadcast_id)
+        now = now or datetime.now(timezone.utc)
+        due = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if now >= due and not broadcast.exists(f"digest:{due.date()}"):
+            await self.send(f"digest:{due.date()}")
+            return 0
+        if now >= due:
+            due += timedelta(days=1)
+        return (due - now).total_seconds()
+
+    async def send(self, name):
+        texts = await build_texts()
+        broadcast_id = broadcast.create(name, texts, "SELECT chat_id, kind || ':' || key AS key FROM subscriptions")
+        if broadcast_id is not None:
+            await self.broadcaster.deliver(self.bot, broadcast_id)
+
+
+scheduler = DigestScheduler()
+
+
+# ------------------------- Commands -------------------------
+@registry.command("subscribe", "/subscribe weather <city> | news [category] → Daily digest")
+async def subscribe_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    kind = context.args[0].lower() if context.args else None
+    if kind == "weather" and len(context.args) > 1:
+        city = subscribe(chat_id, "weather", " ".join(context.args[1:]))
+        await update.message.reply_text(f"✅ Daily weather for {city.title()} at {DIGEST_HOUR}:00 UTC.")
+    elif kind == "news" and (len(context.args) == 1 or context.args[1].lower() in NEWS_CATEGORIES):
+        category = subscribe(chat_id, "news", context.args[1] if len(context.args) > 1 else "technology")
+        await update.message.reply_text(f"✅ Daily {category} news at {DIGEST_HOUR}:00 UTC.")
+    else:
+        current = ", ".join(f"{kind} ({key})" for kind, key in subscriptions(chat_id)) or "none"
+        await update.message.reply_text(
+            "⚠️ Usage: /subscribe weather <city> or /subscribe news [category]\n"
+            f"Categories: {', '.join(NEWS_CATEGORIES)}\nYour subscriptions: {current}"
+        )
+
+
+@registry.command("unsubscribe", "/unsubscribe [weather|news] → Stop daily digests")
+async def unsubscribe_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    kind = context.args[0].lower() if context.args else None
+    if kind not in (None, "weather", "news"):
+        await update.message.reply_text("⚠️ Usage: /unsubscribe [weather|news]")
+        return
+    if unsubscribe(update.effective_chat.id, kind):
+        await update.message.reply_text("🗑 Unsubscribed.")
+    else:
+        await update.message.reply_text("⚠️ You have no such subscription.")
+
+
+@registry.on_startup(primary=True)
+def start_scheduler(app):
+    scheduler.start(app.bot)
+
+
+@registry.on_shutdown
+async def stop_scheduler(app):
+    await scheduler.stop()
@@ -1,17 +1,494 @@
-import requests
-
-def get_crypto_price(symbol="BTC", currency="USD"):
-    try:
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={symbol}&vs_currencies={currency}"
-        data = requests.get(url).json()
-        return f"💰 {symbol.upper()} Price: {data[symbol][currency.lower()]} {currency}"
-    except:
+import os
+import re
+import time
+import asyncio
+import logging
+from telegram import Update
+from telegram.error import Forbidden
+from telegram.ext import ContextTypes
+import db
+import registry
+import http_client
+import metrics
+from cache import TTLS, STALE_TTL, get_cache
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Config -------------------------
+# Quotes are fetched in bulk: CoinGecko takes comma-separated ids and FMP
+# comma-separated tickers, so one request answers every /price and every
+# watchlist that mentions the same symbols. A refresh loop re-fetches all
+# watched symbols every QUOTE_REFRESH_SECONDS and checks every alert against
+# the new prices in one query.
+QUOTE_REFRESH_SECONDS = int(os.getenv("QUOTE_REFRESH_SECONDS", 60))
+COIN_INDEX_SIZE = int(os.getenv("COIN_INDEX_SIZE", 1000))  # largest coins by market cap
+COIN_INDEX_MAX_AGE = 24 * 3600
+COIN_INDEX_RELOAD = 3600  # how often a stale in-memory index is re-read from SQLite
+CRYPTO_BATCH = 250  # ids per CoinGecko request
+STOCK_BATCH = 100  # tickers per FMP request
+ALERT_BATCH = 200
+MAX_SYMBOLS = 10  # per /price
+MAX_WATCHES = 20  # per chat
+CURRENCY = "usd"
+
+# Tickers that resolve before the coin index has been downloaded
+CORE_COINS = {
+    "btc": "bitcoin", "eth": "ethereum", "usdt": "tether", "bnb": "binancecoin",
+    "sol": "solana", "xrp": "ripple", "usdc": "usd-coin", "ada": "cardano",
+    "doge": "dogecoin", "trx": "tron", "ton": "the-open-network", "dot": "polkadot",
+    "ltc": "litecoin", "link": "chainlink", "avax": "avalanche-2", "xlm": "stellar",
+}
+
+
+def init_finance():
+    conn = db.connect()
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS coin_index (
+            symbol TEXT PRIMARY KEY,
+            coin_id TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS watches (
+            chat_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            ref TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            above REAL,
+            below REAL,
+            PRIMARY KEY (chat_id, kind, ref)
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS watches_ref ON watches (kind, ref)")
+
+
+# ------------------------- Symbol index -------------------------
+class CoinIndex:
+    # Ticker -> CoinGecko id for the COIN_INDEX_SIZE largest coins. Tickers are
+    # not unique on CoinGecko, so the coin with the larger market cap wins.
+    # The index is kept in SQLite, shared by all bot processes. The primary
+    # shard downloads it again once it is older than COIN_INDEX_MAX_AGE (from
+    # the QuoteWatcher tick); the others re-read it from SQLite.
+    def __init__(self, size=COIN_INDEX_SIZE):
+        self.size = size
+        self._ids = dict(CORE_COINS)
+        self._updated_at = 0
+        self._loaded_at = 0
+        self._refresh_task = None
+
+    def resolve(self, symbol):
+        if self.stale() and time.time() - self._loaded_at > COIN_INDEX_RELOAD:
+            self.load()  # the primary may have downloaded a newer one
+        return self._ids.get(symbol.lower())
+
+    def stale(self):
+        return time.time() - self._updated_at > COIN_INDEX_MAX_AGE
+
+    def load(self):
+        init_finance()
+        self._loaded_at = time.time()
+        rows = db.connect().execute("SELECT symbol, coin_id, updated_at FROM coin_index").fetchall()
+        if rows:
+            self._ids = {symbol: coin_id for symbol, coin_id, _ in rows}
+            self._ids.update(CORE_COINS)
+            self._updated_at = min(updated_at for _, _, updated_at in rows)
+
+    def refresh(self):
+        # Downloads a new index in the background if the stored one is stale
+        if (self._refresh_task is None or self._refresh_task.done()) and self.stale():
+            self.load()
+            if self.stale():
+                self._refresh_task = asyncio.get_running_loop().create_task(self._download())
+        return self._refresh_task
+
+    async def _download(self):
+        ids = {}
+        try:
+            for page in range(1, (self.size + CRYPTO_BATCH - 1) // CRYPTO_BATCH + 1):
+                params = {"vs_currency": CURRENCY, "order": "market_cap_desc", "per_page": CRYPTO_BATCH, "page": page}
+                coins = await http_client.get_json("coingecko", "/api/v3/coins/markets", params=params)
+                for coin in coins:
+                    ids.setdefault(coin["symbol"].lower(), coin["id"])
+        except Exception:
+            logger.exception("Coin index download failed")
+            if not ids:
+                return
+        now = time.time()
+        conn = db.connect()
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM coin_index")
+        conn.executemany(
+            "INSERT INTO coin_index (symbol, coin_id, updated_at) VALUES (?, ?, ?)",
+            [(symbol, coin_id, now) for symbol, coin_id in ids.items()],
+        )
+        conn.execute("COMMIT")
+        self._ids = dict(ids, **CORE_COINS)
+        self._updated_at = now
+
+
+coin_index = CoinIndex()
+
+
+def parse_symbol(text):
+    # "BTC" -> ("crypto", "bitcoin", "BTC"); "AAPL" or "$COIN" -> ("stock", "AAPL", "AAPL").
+    # Tickers of the indexed coins are crypto; "$" forces a stock ticker.
+    text = text.strip()
+    if text.startswith("$"):
+        ticker = text[1:].upper()
+        return ("stock", ticker, ticker)
+    coin_id = coin_index.resolve(text)
+    if coin_id:
+        return ("crypto", coin_id, text.upper())
+    return ("stock", text.upper(), text.upper())
+
+
+# ------------------------- Batched quotes -------------------------
+@metrics.timed("crypto")
+async def fetch_crypto_prices(coin_ids, currency=CURRENCY):
+    async def fetch(batch):
+        params = {"ids": ",".join(batch), "vs_currencies": currency}
+        return await http_client.get_json("coingecko", "/api/v3/simple/price", params=params)
+
+    batches = [coin_ids[i:i + CRYPTO_BATCH] for i in range(0, len(coin_ids), CRYPTO_BATCH)]
+    prices = {}
+    for data in await asyncio.gather(*[fetch(batch) for batch in batches]):
+        for coin_id, quote in data.items():
+            if quote.get(currency) is not None:
+                prices[coin_id] = quote[currency]
+    return prices
+
+
+@metrics.timed("stock")
+async def fetch_stock_prices(tickers):
+    async def fetch(batch):
+        return await http_client.get_json("fmp", f"/api/v3/quote/{','.join(batch)}", params={"apikey": "demo"})
+
+    batches = [tickers[i:i + STOCK_BATCH] for i in range(0, len(tickers), STOCK_BATCH)]
+    prices = {}
+    for data in await asyncio.gather(*[fetch(batch) for batch in batches]):
+        if isinstance(data, list):
+            for quote in data:
+                if quote.get("price") is not None:
+                    prices[quote["symbol"].upper()] = quote["price"]
+    return prices
+
+
+FETCHERS = {"crypto": fetch_crypto_prices, "stock": lambda refs, currency: fetch_stock_prices(refs)}
+
+
+def quote_key(kind, ref, currency=CURRENCY):
+    return f"{ref}:{currency}" if kind == "crypto" else ref
+
+
+class QuoteBook:
+    # Shared quote cache on top of the "crypto"/"stock" caches. get() returns
+    # fresh quotes from the cache and fetches every missing one with a single
+    # batched request per kind; callers asking for a quote that is already
+    # being fetched wait for that request instead of sending their own.
+    def __init__(self):
+        self._inflight = {}  # (kind, ref, currency) -> future
+
+    async def get(self, instruments, currency=CURRENCY):
+        # instruments: iterable of (kind, ref); returns {(kind, ref): price}
+        prices, missing, waiting = {}, {}, []
+        now = time.monotonic()
+        for kind, ref in set(instruments):
+            entry = get_cache(kind).get(quote_key(kind, ref, currency))
+            if entry is not None and now - entry[1] < TTLS[kind]:
+                prices[(kind, ref)] = entry[0]
+            elif (kind, ref, currency) in self._inflight:
+                waiting.append((kind, ref))
+            else:
+                missing.setdefault(kind, []).append(ref)
+        if missing:
+            prices.update(await self.refresh(missing, currency))
+        for kind, ref in waiting:
+            future = self._inflight.get((kind, ref, currency))
+            price = await asyncio.shield(future) if future else await self._stale(kind, ref, currency)
+            if price is not None:
+                prices[(kind, ref)] = price
+        return {key: price for key, price in prices.items() if price is not None}
+
+    async def refresh(self, refs_by_kind, currency=CURRENCY):
+        # Fetches the given refs ({kind: [ref]}) now, whatever their cache age
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for kind, refs in refs_by_kind.items():
+            for ref in refs:
+                futures[(kind, ref)] = self._inflight[(kind, ref, currency)] = loop.create_future()
+
+        async def fetch(kind, refs):
+            try:
+                return kind, await FETCHERS[kind](refs, currency)
+            except Exception:
+                logger.exception("Fetching %d %s quotes failed", len(refs), kind)
+                return kind, {}
+
+        prices = {}
+        try:
+            for kind, fetched in await asyncio.gather(*[fetch(kind, refs) for kind, refs in refs_by_kind.items()]):
+                for ref in refs_by_kind[kind]:
+                    price = fetched.get(ref)
+                    if price is not None:
+                        get_cache(kind).set(quote_key(kind, ref, currency), price)
+                    else:
+                        # Keep answering with the last price for a while if the upstream fails
+                        price = await self._stale(kind, ref, currency)
+                    prices[(kind, ref)] = price
+        finally:
+            for key, future in futures.items():
+                self._inflight.pop(key + (currency,), None)
+                if not future.done():
+                    future.set_result(prices.get(key))
+        return prices
+
+    async def _stale(self, kind, ref, currency):
+        entry = get_cache(kind).get(quote_key(kind, ref, currency))
+        if entry is not None and time.monotonic() - entry[1] < TTLS[kind] + STALE_TTL:
+            return entry[0]
+        return None
+
+
+quotes = QuoteBook()
+
+
+def format_quote(kind, symbol, price, currency=CURRENCY):
+    if price is None:
+        return f"❓ {symbol}: not found"
+    if kind == "crypto":
+        return f"💰 {symbol}: {price} {currency.upper()}"
+    return f"📈 {symbol}: {price}"
+
+
+async def get_prices(texts):
+    # "/price BTC ETH AAPL" -> one line per symbol
+    parsed = [parse_symbol(text) for text in dict.fromkeys(texts[:MAX_SYMBOLS])]
+    prices = await quotes.get((kind, ref) for kind, ref, _ in parsed)
+    return "\n".join(format_quote(kind, symbol, prices.get((kind, ref))) for kind, ref, symbol in parsed)
+
+
+async def get_crypto_price(symbol="BTC", currency="USD"):
+    coin_id = coin_index.resolve(symbol) or symbol.lower()
+    prices = await quotes.get([("crypto", coin_id)], currency.lower())
+    price = prices.get(("crypto", coin_id))
+    if price is None:
         return "⚠️ Could not fetch crypto price."
+    return f"💰 {symbol.upper()} Price: {price} {currency}"
+
 
-def get_stock_price(symbol="AAPL"):
-    try:
-        url = f"https://financialmodelingprep.com/api/v3/quote-short/{symbol}?apikey=demo"
-        data = requests.get(url).json()
-        return f"📈 {symbol.upper()} Price: {data[0]['price']}"
-    except:
+async def get_stock_price(symbol="AAPL"):
+    prices = await quotes.get([("stock", symbol.upper())])
+    price = prices.get(("stock", symbol.upper()))
+    if price is None:
         return "⚠️ Could not fetch stock price."
+    return f"📈 {symbol.upper()} Price: {price}"
+
+
+# ------------------------- Watchlists -------------------------
+# One row per chat and symbol in SQLite, with optional above/below alert
+# thresholds. An alert fires once and is then cleared.
+def add_watch(chat_id, text, above=None, below=None):
+    # Returns the display symbol, or None if the chat's watchlist is full
+    init_finance()
+    kind, ref, symbol = parse_symbol(text)
+    conn = db.connect()
+    existing = conn.execute(
+        "SELECT above, below FROM watches WHERE chat_id = ? AND kind = ? AND ref = ?", (chat_id, kind, ref)
+    ).fetchone()
+    if existing is None:
+        count = conn.execute("SELECT COUNT(*) FROM watches WHERE chat_id = ?", (chat_id,)).fetchone()[0]
+        if count >= MAX_WATCHES:
+            return None
+        existing = (None, None)
+    conn.execute(
+        "INSERT OR REPLACE INTO watches (chat_id, kind, ref, symbol, above, below) VALUES (?, ?, ?, ?, ?, ?)",
+        (chat_id, kind, ref, symbol, above if above is not None else existing[0],
+         below if below is not None else existing[1]),
+    )
+    return symbol
+
+
+def remove_watch(chat_id, text):
+    init_finance()
+    kind, ref, _ = parse_symbol(text)
+    cursor = db.connect().execute(
+        "DELETE FROM watches WHERE chat_id = ? AND kind = ? AND ref = ?", (chat_id, kind, ref)
+    )
+    return cursor.rowcount > 0
+
+
+async def get_watchlist(chat_id):
+    init_finance()
+    rows = db.connect().execute(
+        "SELECT kind, ref, symbol, above, below FROM watches WHERE chat_id = ? ORDER BY symbol", (chat_id,)
+    ).fetchall()
+    if not rows:
+        return None
+    prices = await quotes.get((kind, ref) for kind, ref, _, _, _ in rows)
+    lines = []
+    for kind, ref, symbol, above, below in rows:
+        line = format_quote(kind, symbol, prices.get((kind, ref)))
+        if above is not None:
+            line += f" (alert ≥ {above:g})"
+        if below is not None:
+            line += f" (alert ≤ {below:g})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class QuoteWatcher:
+    # Runs in one process only (like the reminder scheduler). Each tick
+    # downloads the coin index again if it is stale, fetches the distinct
+    # watched symbols in bulk, refreshing the shared quote cache, then finds
+    # all triggered alerts with one join.
+    def __init__(self, interval=QUOTE_REFRESH_SECONDS):
+        self.interval = interval
+        self.bot = None
+        self._task = None
+
+    def start(self, bot):
+        init_finance()
+        self.bot = bot
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Quote refresh failed")
+            await asyncio.sleep(self.interval)
+
+    async def tick(self):
+        coin_index.refresh()
+        conn = db.connect()
+        refs_by_kind = {}
+        for kind, ref in conn.execute("SELECT DISTINCT kind, ref FROM watches").fetchall():
+            refs_by_kind.setdefault(kind, []).append(ref)
+        if not refs_by_kind:
+            return
+        prices = await quotes.refresh(refs_by_kind)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS tick_prices (kind TEXT, ref TEXT, price REAL, PRIMARY KEY (kind, ref))")
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM tick_prices")
+        conn.executemany(
+            "INSERT INTO tick_prices (kind, ref, price) VALUES (?, ?, ?)",
+            [(kind, ref, price) for (kind, ref), price in prices.items() if price is not None],
+        )
+        conn.execute("COMMIT")
+        triggered = conn.execute(
+            """SELECT w.chat_id, w.kind, w.ref, w.symbol, p.price,
+                      w.above IS NOT NULL AND p.price >= w.above, w.below IS NOT NULL AND p.price <= w.below
+               FROM watches w JOIN tick_prices p ON p.kind = w.kind AND p.ref = w.ref
+               WHERE (w.above IS NOT NULL AND p.price >= w.above) OR (w.below IS NOT NULL AND p.price <= w.below)"""
+        ).fetchall()
+        for i in range(0, len(triggered), ALERT_BATCH):
+            await self._dispatch(conn, triggered[i:i + ALERT_BATCH])
+
+    async def _dispatch(self, conn, alerts):
+        # Only delivered alerts clear their threshold; one that failed to send
+        # stays armed and fires again on the next tick. A chat that blocked
+        # the bot loses its watches.
+        results = await asyncio.gather(
+            *[
+                self.bot.send_message(
+                    chat_id=chat_id,
+                    text=f"🔔 {symbol} is {'up' if crossed_above else 'down'} to {price}",
+                )
+                for chat_id, _, _, symbol, price, crossed_above, _ in alerts
+            ],
+            return_exceptions=True,
+        )
+        delivered, blocked = [], set()
+        for alert, result in zip(alerts, results):
+            chat_id, kind, ref, symbol, _, crossed_above, crossed_below = alert
+            if isinstance(result, Forbidden):
+                blocked.add(chat_id)
+            elif isinstance(result, Exception):
+                logger.warning("Price alert for %s to chat %s failed: %s", symbol, chat_id, result)
+            else:
+                delivered.append((crossed_above, crossed_below, chat_id, kind, ref))
+        conn.execute("BEGIN")
+        conn.executemany(
+            """UPDATE watches SET above = CASE WHEN ? THEN NULL ELSE above END,
+                                  below = CASE WHEN ? THEN NULL ELSE below END
+               WHERE chat_id = ? AND kind = ? AND ref = ?""",
+            delivered,
+        )
+        conn.executemany("DELETE FROM watches WHERE chat_id = ?", [(chat_id,) for chat_id in blocked])
+        conn.execute("COMMIT")
+
+
+watcher = QuoteWatcher()
+
+
+# ------------------------- Commands -------------------------
+@registry.command("price", "/price <symbols> → Crypto & stock prices")
+async def price_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        await update.message.reply_text("⚠️ Usage: /price <symbol> [symbol...] (e.g. /price BTC ETH AAPL)")
+        return
+    await update.message.reply_text(await get_prices(context.args))
+
+
+@registry.command("watch", "/watch <symbol> [> or < price] → Watchlist & price alerts")
+async def watch_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if not context.args:
+        watchlist = await get_watchlist(chat_id)
+        await update.message.reply_text(
+            f"👀 Watchlist:\n{watchlist}" if watchlist else "👀 Your watchlist is empty. Try /watch BTC > 70000"
+        )
+        return
+    match = re.fullmatch(r"(\$?[\w.-]+)\s*(?:([<>])\s*(\d+(?:\.\d+)?))?", " ".join(context.args))
+    if not match:
+        await update.message.reply_text("⚠️ Usage: /watch <symbol> [> or < price]")
+        return
+    text, op, threshold = match.groups()
+    threshold = float(threshold) if threshold else None
+    symbol = add_watch(
+        chat_id, text, above=threshold if op == ">" else None, below=threshold if op == "<" else None
+    )
+    if symbol is None:
+        await update.message.reply_text("⚠️ Your watchlist is full. Remove a symbol with /unwatch <symbol>.")
+    elif op:
+        await update.message.reply_text(f"🔔 I'll tell you when {symbol} goes {'above' if op == '>' else 'below'} {threshold:g}.")
+    else:
+        await update.message.reply_text(f"👀 Watching {symbol}.")
+
+
+@registry.command("unwatch", "/unwatch <symbol> → Remove from watchlist")
+async def unwatch_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not context.args:
+        await update.message.reply_text("⚠️ Usage: /unwatch <symbol>")
+        return
+    if remove_watch(update.effective_chat.id, context.args[0]):
+        await update.message.reply_text(f"🗑 Removed {context.args[0].upper()} from your watchlist.")
+    else:
+        await update.message.reply_text(f"⚠️ {context.args[0].upper()} is not on your watchlist.")
+
+
+@registry.on_startup()
+def load_coin_index(app):
+    # Only the primary downloads it, from the QuoteWatcher tick
+    coin_index.load()
+
+
+@registry.on_startup(primary=True)
+def start_watcher(app):
+    watcher.start(app.bot)
+
+
+@registry.on_shutdown
+async def stop_watcher(app):
+    await watcher.stop()
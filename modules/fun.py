@@ -1,4 +1,135 @@
+import asyncio
+import random
+from collections import OrderedDict, deque
+from telegram import Update
+from telegram.ext import ContextTypes
+import registry
 from utils import fetch_fun_fact
 
-def get_fun_fact():
-    return fetch_fun_fact()
+# ------------------------- Fact buffer -------------------------
+# /fun answers from memory. Fresh facts are prefetched from uselessfacts into
+# a buffer that is topped up to HIGH_WATER whenever it drops below LOW_WATER.
+# Served facts move to a recycle ring so bursts that drain the buffer still
+# get facts the chat hasn't seen, and the offline list covers outages.
+LOW_WATER = 20
+HIGH_WATER = 100
+RECYCLE_SIZE = 500
+RECENT_PER_CHAT = 50
+MAX_CHATS = 10000
+
+OFFLINE_FACTS = [
+    "Honey never spoils; edible honey has been found in ancient Egyptian tombs.",
+    "Octopuses have three hearts and blue blood.",
+    "Bananas are berries, but strawberries are not.",
+    "A day on Venus is longer than a year on Venus.",
+    "Sharks existed before trees.",
+    "The Eiffel Tower can be about 15 cm taller in summer due to thermal expansion.",
+    "Wombat poop is cube-shaped.",
+    "There are more possible games of chess than atoms in the observable universe.",
+    "Sea otters hold hands while sleeping so they don't drift apart.",
+    "A group of flamingos is called a flamboyance.",
+    "The first computer bug was an actual moth found in a Harvard Mark II relay.",
+    "Cleopatra lived closer in time to the Moon landing than to the building of the Great Pyramid.",
+    "Hot water can freeze faster than cold water, known as the Mpemba effect.",
+    "The inventor of the Pringles can is buried in one.",
+    "Koalas have fingerprints almost identical to humans'.",
+    "An adult human has fewer bones than a newborn baby.",
+    "Lightning is about five times hotter than the surface of the Sun.",
+    "The shortest war in history lasted about 38 minutes.",
+    "Butterflies taste with their feet.",
+    "A single cloud can weigh more than a million pounds.",
+]
+
+
+class FactBuffer:
+    def __init__(self, low_water=LOW_WATER, high_water=HIGH_WATER):
+        self.low_water = low_water
+        self.high_water = high_water
+        self._fresh = deque()
+        self._recycled = deque(maxlen=RECYCLE_SIZE)
+        self._known = set()  # texts in _fresh or _recycled, for dedup on fetch
+        self._recent = OrderedDict()  # chat_id -> deque of facts recently sent there
+        self._fill_task = None
+
+    def fill(self):
+        if self._fill_task is None or self._fill_task.done():
+            self._fill_task = asyncio.get_running_loop().create_task(self._fill())
+        return self._fill_task
+
+    async def _fill(self):
+        while len(self._fresh) < self.high_water:
+            wanted = min(10, self.high_water - len(self._fresh))
+            facts = await asyncio.gather(*[fetch_fun_fact() for _ in range(wanted)])
+            added = 0
+            for fact in facts:
+                if fact and fact not in self._known:
+                    self._known.add(fact)
+                    self._fresh.append(fact)
+                    added += 1
+            if not added:
+                return  # upstream down or only repeats; retry on the next low-water hit
+
+    def get(self, chat_id=None):
+        if len(self._fresh) < self.low_water:
+            self.fill()
+        recent = self._recent_for(chat_id)
+        fact = self._pick_fresh(recent) or self._pick(self._recycled, recent) or self._pick(OFFLINE_FACTS, recent)
+        if fact is None:
+            fact = random.choice(OFFLINE_FACTS)
+        if recent is not None:
+            recent.append(fact)
+        return fact
+
+    def _pick_fresh(self, recent):
+        while self._fresh:
+            fact = self._fresh.popleft()
+            if len(self._recycled) == self._recycled.maxlen:
+                self._known.discard(self._recycled[0])
+            self._recycled.append(fact)
+            if recent is None or fact not in recent:
+                return fact
+        return None
+
+    def _pick(self, facts, recent):
+        if not facts:
+            return None
+        # A few random probes keep this O(1) instead of scanning every fact
+        for _ in range(8):
+            fact = random.choice(facts)
+            if recent is None or fact not in recent:
+                return fact
+        return None
+
+    def _recent_for(self, chat_id):
+        if chat_id is None:
+            return None
+        recent = self._recent.pop(chat_id, None)
+        if recent is None:
+            recent = deque(maxlen=RECENT_PER_CHAT)
+        self._recent[chat_id] = recent
+        while len(self._recent) > MAX_CHATS:
+            self._recent.popitem(last=False)
+        return recent
+
+
+buffer = FactBuffer()
+
+
+async def get_fun_fact(chat_id=None):
+    return buffer.get(chat_id)
+
+
+# ------------------------- Commands -------------------------
+@registry.command("fun", "/fun → Fun fact")
+async def fun_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text(await get_fun_fact(update.effective_chat.id))
+
+
+@registry.button("🎉 Fun Fact", "fun")
+async def fun_button(query):
+    await query.message.reply_text(f"🎉 Fun Fact:\n{await get_fun_fact(query.message.chat_id)}")
+
+
+@registry.on_startup()
+def fill_buffer(app):
+    buffer.fill()
@@ -0,0 +1,188 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+import httpx
+from telegram import Update
+from telegram.ext import ContextTypes
+import registry
+import http_client
+import metrics
+from workers import BUSY_MESSAGE
+from cache import MemoryCache, normalize_text
+from circuit import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# AI Image generation using HuggingFace API
+HF_IMAGE_MODEL = "gsdf/Counterfeit-V2.5"
+
+@metrics.timed("image")
+async def request_image(prompt, model=HF_IMAGE_MODEL):
+    headers = {"Authorization": f"Bearer {os.getenv('HF_API_KEY')}"}  # Free HuggingFace API key
+    return await http_client.post("huggingface", f"/models/{model}", headers=headers, json={"inputs": prompt})
+
+# ------------------------- Job queue -------------------------
+# /image enqueues a job and returns at once. IMAGE_WORKERS workers generate
+# images one job each, retrying with backoff while HuggingFace answers 503
+# "model loading" (or 429), times out or can't be reached. Progress and the result go to the job's
+# listeners. Identical prompts share one job, and finished images are cached
+# by sha256(model + prompt).
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+IMAGE_QUEUE_SIZE = int(os.getenv("IMAGE_QUEUE_SIZE", 50))
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", 64 * 1024 * 1024))
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 5
+BACKOFF_MAX = 60
+
+
+class ImageJob:
+    __slots__ = ("id", "key", "prompt", "model", "listeners")
+
+    def __init__(self, key, prompt, model):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.prompt = prompt
+        self.model = model
+        self.listeners = []  # (on_progress, on_done)
+
+
+class ImageJobs:
+    def __init__(self, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE, cache_bytes=IMAGE_CACHE_BYTES):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.cache = MemoryCache(max_entries=1000, max_bytes=cache_bytes)
+        self._queue = None
+        self._tasks = []
+        self._jobs = {}  # key -> job queued or running
+
+    def submit(self, prompt, on_progress, on_done, model=HF_IMAGE_MODEL):
+        # on_progress(text) and on_done(image bytes or None) are coroutine
+        # functions. Returns the job id; raises asyncio.QueueFull when busy.
+        self._start()
+        key = hashlib.sha256(f"{model}\0{normalize_text(prompt)}".encode()).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            asyncio.get_running_loop().create_task(on_done(cached[0]))
+            return key[:12]
+
+        job = self._jobs.get(key)
+        if job is None:
+            job = ImageJob(key, prompt, model)
+            self._queue.put_nowait(job)
+            self._jobs[key] = job
+        job.listeners.append((on_progress, on_done))
+        return job.id
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            image = None
+            try:
+                image = await self._generate(job)
+            except Exception:
+                logger.exception("Image job %s failed", job.id)
+            finally:
+                self._jobs.pop(job.key, None)
+            if image is not None:
+                self.cache.set(job.key, image)
+            await self._notify(job, image=image)
+
+    async def _generate(self, job):
+        await self._notify(job, progress="Generating image...")
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            estimated = 0
+            try:
+                response = await request_image(job.prompt, job.model)
+            except (httpx.TransportError, CircuitOpen) as e:  # timeouts and connection errors
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                reason = "HuggingFace is not responding"
+                estimated = getattr(e, "retry_in", 0)
+            else:
+                if response.status_code == 200:
+                    return response.content
+                if response.status_code not in (429, 503) or attempt == MAX_ATTEMPTS:
+                    return None
+                reason = "Model is warming up"
+                try:
+                    estimated = float(response.json().get("estimated_time", 0))
+                except Exception:
+                    pass
+            delay = min(BACKOFF_MAX, max(estimated, BACKOFF_BASE * 2 ** (attempt - 1)))
+            await self._notify(
+                job, progress=f"{reason}, retrying in {int(delay)}s (attempt {attempt}/{MAX_ATTEMPTS})..."
+            )
+            await asyncio.sleep(delay)
+        return None
+
+    async def _notify(self, job, progress=None, image=None):
+        # Sends progress text if given, otherwise the final result
+        for on_progress, on_done in list(job.listeners):
+            try:
+                if progress is not None:
+                    await on_progress(progress)
+                else:
+                    await on_done(image)
+            except Exception:
+                logger.exception("Image job %s listener failed", job.id)
+
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+
+image_jobs = ImageJobs()
+
+
+# ------------------------- Commands -------------------------
+@registry.command("image", "/image <prompt> → AI generated image")
+async def image_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    prompt = " ".join(context.args)
+    if not prompt:
+        await update.message.reply_text("❌ Provide a prompt!")
+        return
+    queued = image_jobs.pending()
+    shown = "🎨 Generating image..." if not queued else f"🎨 Queued for generation (position {queued + 1})..."
+    status = await update.message.reply_text(shown)
+
+    async def on_progress(text):
+        nonlocal shown
+        if f"🎨 {text}" != shown:
+            shown = f"🎨 {text}"
+            await status.edit_text(shown)
+
+    async def on_done(image):
+        if image:
+            await update.message.reply_photo(photo=image)
+            await status.delete()
+        else:
+            await status.edit_text("⚠️ Could not generate image.")
+
+    try:
+        image_jobs.submit(prompt, on_progress, on_done)
+    except asyncio.QueueFull:
+        await status.edit_text(BUSY_MESSAGE)
+
+
+@registry.button("🖼 AI Image", "image")
+async def image_button(query):
+    await query.message.reply_text("🖼 Type /image <prompt> to generate an AI image.")
+
+
+@registry.on_shutdown
+async def stop_jobs(app):
+    await image_jobs.stop()
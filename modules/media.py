@@ -1,39 +1,131 @@
-import requests
+import asyncio
+import workers
 from io import BytesIO
-from pydub import AudioSegment
 import os
+from telegram import Update
+from telegram.ext import ContextTypes, filters
+import metrics
+import registry
+from workers import PoolBusy, BUSY_MESSAGE
 
-# AI Image generation using HuggingFace API
-HF_API_KEY = os.getenv("HF_API_KEY")  # Free HuggingFace API key
-HF_IMAGE_URL = "https://api-inference.huggingface.co/models/gsdf/Counterfeit-V2.5"
-
-def generate_image(prompt):
-    headers = {"Authorization": f"Bearer {HF_API_KEY}"}
-    payload = {"inputs": prompt}
-    response = requests.post(HF_IMAGE_URL, headers=headers, json=payload)
-    if response.status_code == 200:
-        return BytesIO(response.content)
-    return None
+# gTTS, pydub and SpeechRecognition are imported inside the functions that
+# use them, so the bot starts without loading them until the first /say or
+# voice message
 
 # TTS: using gTTS (Google Text-to-Speech)
-from gtts import gTTS
+import hashlib
+from cache import MemoryCache
 
-def text_to_speech(text):
-    tts = gTTS(text)
-    file_path = "speech.mp3"
-    tts.save(file_path)
-    return file_path
+# Synthesized clips by content hash, capped by total bytes
+TTS_CACHE_BYTES = int(os.getenv("TTS_CACHE_BYTES", 32 * 1024 * 1024))
+_clips = MemoryCache(max_entries=10000, max_bytes=TTS_CACHE_BYTES)
 
-# STT: converting voice to text using SpeechRecognition
-import speech_recognition as sr
+def text_to_speech(text, lang="en"):
+    from gtts import gTTS
+    buffer = BytesIO()
+    gTTS(text, lang=lang).write_to_fp(buffer)
+    return buffer.getvalue()
 
-def speech_to_text(file_path):
+@metrics.timed("tts")
+async def synthesize(text, lang="en"):
+    key = hashlib.sha256(f"{lang}\0{text}".encode()).hexdigest()
+    entry = _clips.get(key)
+    if entry is not None:
+        return entry[0]
+    audio = await workers.run("tts", text_to_speech, text, lang)
+    _clips.set(key, audio)
+    return audio
+
+# STT: converting voice to text using SpeechRecognition
+def speech_to_text(source):
+    # source is a WAV file path or file object; "" when nothing was recognized
+    import speech_recognition as sr
     r = sr.Recognizer()
-    audio = sr.AudioFile(file_path)
-    with audio as source:
-        audio_data = r.record(source)
+    with sr.AudioFile(source) as audio:
+        audio_data = r.record(audio)
     try:
-        text = r.recognize_google(audio_data)
-        return text
-    except:
-        return "⚠️ Could not recognize speech."
+        return r.recognize_google(audio_data)
+    except sr.UnknownValueError:
+        return ""
+
+# ------------------------- Voice notes -------------------------
+# Telegram voice notes are OGG/Opus. They are decoded to 16 kHz mono WAV in
+# memory (ffmpeg reads from a pipe) and cut into chunks short enough for the
+# free Google recognizer; the chunks are then recognized in parallel.
+STT_CHUNK_SECONDS = 30
+# Chunks of one note being recognized at once; a long note queues its own
+# chunks instead of filling the stt pool's queue and getting PoolBusy
+STT_CHUNKS_IN_FLIGHT = 4
+# Send transcribed voice messages on to the AI chat, as if typed after /chat
+VOICE_TO_CHAT = os.getenv("VOICE_TO_CHAT", "").lower() in ("1", "true", "yes")
+MAX_VOICE_BYTES = 20 * 1024 * 1024  # Bot API download limit
+
+def decode_voice(data, chunk_seconds=STT_CHUNK_SECONDS):
+    # Runs in the audio process pool: pure CPU, no event loop access
+    from pydub import AudioSegment
+    audio = AudioSegment.from_file(BytesIO(data), format="ogg").set_channels(1).set_frame_rate(16000)
+    chunks = []
+    for start in range(0, len(audio), chunk_seconds * 1000):
+        buffer = BytesIO()
+        audio[start:start + chunk_seconds * 1000].export(buffer, format="wav")
+        chunks.append(buffer.getvalue())
+    return chunks
+
+@metrics.timed("stt")
+async def transcribe_voice(data):
+    chunks = await workers.run("audio", decode_voice, data)
+    slots = asyncio.Semaphore(STT_CHUNKS_IN_FLIGHT)
+
+    async def recognize(chunk):
+        async with slots:
+            return await workers.run("stt", speech_to_text, BytesIO(chunk))
+
+    tasks = [asyncio.ensure_future(recognize(chunk)) for chunk in chunks]
+    try:
+        texts = await asyncio.gather(*tasks)
+    finally:
+        # One chunk failed (or we were cancelled): the rest would be wasted work
+        for task in tasks:
+            task.cancel()
+    return " ".join(text for text in texts if text)
+
+# ------------------------- Commands -------------------------
+@registry.command("say", "/say <message> → Text-to-speech")
+async def say_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = " ".join(context.args)
+    if not text:
+        await update.message.reply_text("❌ Provide text to speak.")
+        return
+    try:
+        audio = await synthesize(text)
+    except PoolBusy:
+        await update.message.reply_text(BUSY_MESSAGE)
+        return
+    await update.message.reply_audio(audio, filename="speech.mp3")
+
+@registry.message(filters.VOICE)
+async def voice_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    voice = update.message.voice
+    if voice.file_size and voice.file_size > MAX_VOICE_BYTES:
+        await update.message.reply_text("⚠️ Voice message is too long.")
+        return
+    try:
+        data = await (await context.bot.get_file(voice.file_id)).download_as_bytearray()
+        text = await transcribe_voice(bytes(data))
+    except PoolBusy:
+        await update.message.reply_text(BUSY_MESSAGE)
+        return
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Could not transcribe voice message: {e}")
+        return
+    if not text:
+        await update.message.reply_text("⚠️ Could not recognize speech.")
+        return
+    await update.message.reply_text(f"🗣 {text}")
+    if VOICE_TO_CHAT and registry.enabled("ai"):
+        from modules.ai import answer_chat
+        await answer_chat(update.message, update.effective_chat.id, text)
+
+@registry.button("🔊 TTS", "tts")
+async def tts_button(query):
+    await query.message.reply_text("🔊 Type /say <message> for text-to-speech.")
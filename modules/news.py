@@ -1,5 +1,27 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+import registry
+from circuit import CircuitOpen
 from utils import fetch_news
 import os
+import logging
 
-def get_news():
-    return fetch_news(os.getenv("NEWS_API_KEY"))
+logger = logging.getLogger(__name__)
+
+async def get_news():
+    return await fetch_news(os.getenv("NEWS_API_KEY"))
+
+# ------------------------- Commands -------------------------
+@registry.command("news", "/news → Tech news")
+async def news_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await update.message.reply_text(await get_news())
+    except CircuitOpen as e:
+        await update.message.reply_text(f"⚠️ News is temporarily unavailable, try again in {int(e.retry_in) + 1}s.")
+    except Exception:
+        logger.exception("News lookup failed")
+        await update.message.reply_text("⚠️ Could not fetch news!")
+
+@registry.button("📰 News", "news")
+async def news_button(query):
+    await query.message.reply_text("📰 Type /news to see top tech news.")
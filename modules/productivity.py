@@ -1,6 +1,161 @@
 import asyncio
+import logging
+import time
+from telegram import Update
+from telegram.ext import ContextTypes
+import db
+import registry
 
-async def set_reminder(minutes, message, context):
-    await context.bot.send_message(chat_id=context._chat_id, text=f"✅ Reminder set for {minutes} minutes!")
-    await asyncio.sleep(minutes * 60)
-    await context.bot.send_message(chat_id=context._chat_id, text=f"⏰ Reminder: {message}")
+logger = logging.getLogger(__name__)
+
+# ------------------------- Reminder store -------------------------
+# Reminders live only in SQLite; the scheduler keeps no per-reminder state in
+# memory; it just asks the due_at index for the next batch. Pending reminders
+# therefore survive restarts and are picked up by the first loop iteration.
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60
+ERROR_DELAY = 5  # pause after a failed pass before trying again
+# add() only wakes the loop of its own process; the loop runs on shard 0, so
+# it also looks for reminders added by other shards at least this often
+MAX_IDLE = 5
+
+
+def init_reminders():
+    conn = db.connect()
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            due_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )"""
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS reminders_due_at ON reminders (due_at)")
+
+
+class ReminderScheduler:
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.bot = None
+        self._wake = asyncio.Event()
+        self._task = None
+        self._ready = False
+
+    def _init(self):
+        if not self._ready:
+            init_reminders()
+            self._ready = True
+
+    def start(self, bot):
+        self._init()
+        self.bot = bot
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def add(self, chat_id, minutes, message):
+        self._init()  # shards other than 0 never start() the loop
+        due_at = time.time() + minutes * 60
+        cursor = db.connect().execute(
+            "INSERT INTO reminders (chat_id, message, due_at) VALUES (?, ?, ?)",
+            (chat_id, message, due_at),
+        )
+        # Wake the loop in case this reminder is due before the one it sleeps on
+        self._wake.set()
+        return cursor.lastrowid
+
+    def pending_count(self):
+        return db.connect().execute("SELECT COUNT(*) FROM reminders").fetchone()[0]
+
+    async def _run(self):
+        conn = db.connect()
+        while True:
+            self._wake.clear()
+            try:
+                timeout = await self.tick(conn)
+            except Exception:
+                logger.exception("Reminder pass failed")
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                timeout = ERROR_DELAY
+            if timeout == 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), MAX_IDLE if timeout is None else min(timeout, MAX_IDLE))
+            except asyncio.TimeoutError:
+                pass
+
+    async def tick(self, conn):
+        # Sends one batch of due reminders; returns seconds until the next is
+        # due (0: more are due now, None: nothing pending)
+        now = time.time()
+        due = conn.execute(
+            "SELECT id, chat_id, message, attempts FROM reminders WHERE due_at <= ? ORDER BY due_at LIMIT ?",
+            (now, self.batch_size),
+        ).fetchall()
+        if due:
+            await self._dispatch(conn, due)
+            return 0
+        row = conn.execute("SELECT MIN(due_at) FROM reminders").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    async def _dispatch(self, conn, due):
+        results = await asyncio.gather(
+            *[self.bot.send_message(chat_id=chat_id, text=f"⏰ Reminder: {message}") for _, chat_id, message, _ in due],
+            return_exceptions=True,
+        )
+        done, retry = [], []
+        for (reminder_id, _, _, attempts), result in zip(due, results):
+            if isinstance(result, Exception) and attempts + 1 < MAX_ATTEMPTS:
+                retry.append((time.time() + RETRY_DELAY, reminder_id))
+            else:
+                done.append((reminder_id,))
+        conn.execute("BEGIN")
+        conn.executemany("DELETE FROM reminders WHERE id = ?", done)
+        conn.executemany("UPDATE reminders SET due_at = ?, attempts = attempts + 1 WHERE id = ?", retry)
+        conn.execute("COMMIT")
+
+
+scheduler = ReminderScheduler()
+
+
+async def set_reminder(minutes, message, chat_id):
+    return scheduler.add(chat_id, minutes, message)
+
+
+# ------------------------- Commands -------------------------
+@registry.command("remind", "/remind <minutes> <message> → Reminders")
+async def remind_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        minutes = int(context.args[0])
+        message = " ".join(context.args[1:])
+        if minutes <= 0:
+            raise ValueError
+        await set_reminder(minutes, message, update.effective_chat.id)
+        await update.message.reply_text(f"✅ Reminder set for {minutes} min!")
+    except (IndexError, ValueError):
+        await update.message.reply_text("⚠️ Usage: /remind <minutes> <message>")
+
+
+@registry.button("⏰ Reminders", "remind")
+async def remind_button(query):
+    await query.message.reply_text("⏰ Type /remind <minutes> <message> to set a reminder.")
+
+
+@registry.on_startup(primary=True)
+def start_scheduler(app):
+    scheduler.start(app.bot)
+
+
+@registry.on_shutdown
+async def stop_scheduler(app):
+    await scheduler.stop()
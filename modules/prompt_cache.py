@@ -0,0 +1,141 @@
+import os
+import re
+import time
+import hashlib
+from collections import OrderedDict
+import metrics
+
+# ------------------------- Config -------------------------
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", 3600))
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", 2000))
+# Estimated Jaccard similarity needed for a near-duplicate hit; 0 (the
+# default) means exact matches of the normalized prompt only. Character
+# overlap alone confuses "india" with "indiana", so a near-duplicate must
+# also have exactly the same content words.
+PROMPT_CACHE_SIMILARITY = float(os.getenv("PROMPT_CACHE_SIMILARITY", 0))
+STOPWORDS = frozenset(
+    "a an the is are was were be of to in on for and or what whats who whos how hows which "
+    "do does did can could please tell me about".split()
+)
+
+NUM_PERM = 64
+BANDS = 16  # LSH bands of NUM_PERM // BANDS rows each
+_PRIME = (1 << 61) - 1
+_SEEDS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME)
+    for i in range(NUM_PERM)
+]
+
+
+def normalize_prompt(prompt):
+    # "What is Python?" / "what  is python" -> "what is python"
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+
+def content_words(text):
+    return frozenset(word for word in text.split() if word not in STOPWORDS)
+
+
+def minhash(text, shingle=3):
+    text = f" {text} "
+    shingles = {text[i:i + shingle] for i in range(max(1, len(text) - shingle + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _SEEDS)
+
+
+def _bands(signature):
+    rows = NUM_PERM // BANDS
+    return [(i, signature[i * rows:(i + 1) * rows]) for i in range(BANDS)]
+
+
+class PromptCache:
+    # Answers keyed on the normalized prompt, with an optional MinHash/LSH
+    # fallback so near-identical wording ("whats python" vs "what is python")
+    # also hits.
+    def __init__(self, ttl=PROMPT_CACHE_TTL, max_entries=PROMPT_CACHE_SIZE, similarity=PROMPT_CACHE_SIMILARITY):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> (answer, signature, latency, stored_at)
+        self._buckets = {}  # (band, rows) -> set of keys
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, prompt):
+        key = normalize_prompt(prompt)
+        entry = self._live_entry(key)
+        if entry is None and self.similarity > 0:
+            signature = minhash(key)
+            candidates = set()
+            for band in _bands(signature):
+                candidates |= self._buckets.get(band, set())
+            best, best_score = None, self.similarity
+            words = content_words(key)
+            for candidate in candidates:
+                if content_words(candidate) != words:
+                    continue
+                other = self._live_entry(candidate)
+                if other is None:
+                    continue
+                score = sum(x == y for x, y in zip(signature, other[1])) / NUM_PERM
+                if score >= best_score:
+                    best, best_score = other, score
+            if best is not None:
+                self.near_hits += 1
+                self.saved_seconds += best[2]
+                return best[0]
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += entry[2]
+        return entry[0]
+
+    def store(self, prompt, answer, latency=0.0):
+        key = normalize_prompt(prompt)
+        self._remove(key)
+        signature = minhash(key) if self.similarity > 0 else ()
+        self._entries[key] = (answer, signature, latency, time.monotonic())
+        for band in _bands(signature) if signature else []:
+            self._buckets.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.near_hits) / total, 3) if total else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "size": len(self._entries),
+        }
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[3] >= self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band in _bands(entry[1]) if entry[1] else []:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+
+prompt_cache = PromptCache()
+metrics.stats_collector("prompt_cache", prompt_cache.stats)
@@ -1,15 +1,202 @@
-import requests
+import asyncio
 import html
 import random
+import secrets
+from collections import OrderedDict, deque
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+import registry
+import http_client
+import metrics
+from store import get_store
 
-user_scores = {}
-
-def get_trivia_question():
-    url = "https://opentdb.com/api.php?amount=1&type=multiple"
-    data = requests.get(url).json()
-    question_data = data["results"][0]
-    question = html.unescape(question_data["question"])
-    correct = html.unescape(question_data["correct_answer"])
-    options = [html.unescape(opt) for opt in question_data["incorrect_answers"]] + [correct]
-    random.shuffle(options)
-    return {"question": question, "options": options, "correct": correct}
+# ------------------------- Question pool -------------------------
+# Questions are fetched from OpenTDB in bulk and served from memory. When the
+# pool drops to LOW_WATER a background task fetches the next batch.
+BATCH_SIZE = 50
+LOW_WATER = 10
+MAX_ACTIVE = 10000  # questions still accepting answers, oldest dropped first
+
+
+@metrics.timed("trivia")
+async def fetch_questions(amount=BATCH_SIZE):
+    params = {"amount": amount, "type": "multiple"}
+    data = await http_client.get_json("opentdb", "/api.php", params=params)
+    questions = []
+    for question_data in data.get("results", []):
+        correct = html.unescape(question_data["correct_answer"])
+        options = [html.unescape(opt) for opt in question_data["incorrect_answers"]] + [correct]
+        random.shuffle(options)
+        questions.append({
+            "question": html.unescape(question_data["question"]),
+            "options": options,
+            "correct": correct,
+        })
+    return questions
+
+
+class TriviaPool:
+    def __init__(self, batch_size=BATCH_SIZE, low_water=LOW_WATER, max_active=MAX_ACTIVE):
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self.max_active = max_active
+        self._pool = deque()
+        # question id -> (correct index, user ids that answered). Ids are random,
+        # so a button left over from another process or an earlier run never
+        # matches a new question; it just reports "expired".
+        self._active = OrderedDict()
+        self._refill_task = None
+
+    def refill(self):
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+        return self._refill_task
+
+    async def _refill(self):
+        try:
+            self._pool.extend(await fetch_questions(self.batch_size))
+        except Exception:
+            pass  # next get() schedules another attempt
+
+    async def get(self):
+        if len(self._pool) <= self.low_water:
+            task = self.refill()
+            if not self._pool:
+                await asyncio.shield(task)
+        if not self._pool:
+            return None
+        question = dict(self._pool.popleft(), id=secrets.token_hex(6))
+        self._active[question["id"]] = (question["options"].index(question["correct"]), set())
+        while len(self._active) > self.max_active:
+            self._active.popitem(last=False)
+        return question
+
+    def answer(self, question_id, user_id, choice):
+        # Returns "correct", "wrong", "repeat" (already answered) or "expired",
+        # plus the index of the right option when it is known
+        active = self._active.get(question_id)
+        if active is None:
+            return "expired", None
+        correct_index, answered = active
+        if user_id in answered:
+            return "repeat", correct_index
+        answered.add(user_id)
+        return ("correct" if choice == correct_index else "wrong"), correct_index
+
+
+pool = TriviaPool()
+
+
+async def get_trivia_question():
+    try:
+        question = await pool.get()
+    except Exception:
+        question = None
+    return question or {"id": None, "question": "Trivia not available", "options": [], "correct": ""}
+
+
+# ------------------------- Answer buttons -------------------------
+# Callback data stays well under Telegram's 64-byte limit: "tv:<id>:<option>"
+def answer_callback_data(question_id, option_index):
+    return f"tv:{question_id}:{option_index}"
+
+
+def parse_callback_data(data):
+    # (question id, option index), or None for malformed data
+    parts = data.split(":")
+    if len(parts) != 3 or not parts[1] or not parts[2].isdigit():
+        return None
+    return parts[1], int(parts[2])
+
+
+# ------------------------- Scores -------------------------
+# Kept in the shared state store so every bot process sees the same totals
+async def record_answer(user_id, name, correct):
+    state = get_store()
+    await state.set("trivia:names", user_id, name)
+    await state.incr("trivia:correct", user_id, int(correct))
+    await state.incr("trivia:answered", user_id)
+
+
+async def get_score(user_id):
+    state = get_store()
+    return await state.count("trivia:correct", user_id), await state.count("trivia:answered", user_id)
+
+
+async def leaderboard(limit=10):
+    state = get_store()
+    rows = []
+    for user_id, correct in await state.top("trivia:correct", limit):
+        name = await state.get("trivia:names", user_id) or "?"
+        rows.append((name, correct, await state.count("trivia:answered", user_id)))
+    return rows
+
+
+async def check_answer(data, user_id, name):
+    parsed = parse_callback_data(data)
+    if parsed is None:
+        return "invalid", None
+    question_id, choice = parsed
+    status, correct_index = pool.answer(question_id, user_id, choice)
+    if status in ("correct", "wrong"):
+        await record_answer(user_id, name, status == "correct")
+    return status, correct_index
+
+
+# ------------------------- Commands -------------------------
+async def send_trivia(message):
+    q = await get_trivia_question()
+    if not q["options"]:
+        await message.reply_text(f"❓ {q['question']}")
+        return
+    keyboard = [
+        [InlineKeyboardButton(option, callback_data=answer_callback_data(q["id"], i))]
+        for i, option in enumerate(q["options"])
+    ]
+    await message.reply_text(f"❓ Trivia:\n{q['question']}", reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+@registry.command("trivia", "/trivia → Trivia game")
+async def trivia_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await send_trivia(update.message)
+
+
+@registry.command("leaderboard", "/leaderboard → Trivia top scores")
+async def leaderboard_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    rows = await leaderboard()
+    if not rows:
+        await update.message.reply_text("🏆 No trivia scores yet. Try /trivia!")
+        return
+    lines = [f"{i}. {name}: {correct}/{answered}" for i, (name, correct, answered) in enumerate(rows, 1)]
+    await update.message.reply_text("🏆 Trivia Leaderboard:\n" + "\n".join(lines))
+
+
+@registry.button("❓ Trivia", "trivia")
+async def trivia_button(query):
+    await send_trivia(query.message)
+
+
+@registry.callback("tv:")
+async def trivia_answer(query):
+    user = query.from_user
+    status, correct_index = await check_answer(query.data, user.id, user.first_name)
+    if status == "invalid":
+        await query.answer()
+        return
+    if status == "expired":
+        await query.answer("⌛ This question has expired.")
+        return
+    if status == "repeat":
+        await query.answer("You already answered this one.")
+        return
+    correct, answered = await get_score(user.id)
+    if status == "correct":
+        await query.answer(f"✅ Correct! Score: {correct}/{answered}")
+    else:
+        answer = query.message.reply_markup.inline_keyboard[correct_index][0].text
+        await query.answer(f"❌ Wrong! It was: {answer}\nScore: {correct}/{answered}", show_alert=True)
+
+
+@registry.on_startup()
+def refill_pool(app):
+    pool.refill()
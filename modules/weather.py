@@ -1,5 +1,32 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+import registry
+from circuit import CircuitOpen
 from utils import fetch_weather
 import os
 
-def get_weather(city):
-    return fetch_weather(city, os.getenv("OPENWEATHER_API_KEY"))
+async def get_weather(city):
+    return await fetch_weather(city, os.getenv("OPENWEATHER_API_KEY"))
+
+# ------------------------- Commands -------------------------
+@registry.command("weather", "/weather <city> → Weather updates")
+async def weather_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    city = " ".join(context.args)
+    if not city:
+        await update.message.reply_text("❌ Provide a city name!")
+        return
+    try:
+        reply = await get_weather(city)
+        if reply is None:
+            await update.message.reply_text(f"⚠️ City '{city}' not found. Try 'City,CountryCode'")
+            return
+        await update.message.reply_text(reply)
+
+    except CircuitOpen as e:
+        await update.message.reply_text(f"⚠️ Weather is temporarily unavailable, try again in {int(e.retry_in) + 1}s.")
+    except Exception as e:
+        await update.message.reply_text(f"⚠️ Error fetching weather: {e}")
+
+@registry.button("🌦 Weather", "weather")
+async def weather_button(query):
+    await query.message.reply_text("🌦 Type /weather <city> to get live weather updates.")
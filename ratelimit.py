@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from telegram import Update
+from telegram.error import RetryAfter
+from telegram.ext import ApplicationHandlerStop, BaseRateLimiter, ContextTypes
+import metrics
+from sharding import shard_count
+
+# ------------------------- Config -------------------------
+# RATE_LIMITS=off turns off per-user command limits, upstream budgets and
+# outgoing flood pacing, for load tests against a fake Bot API
+RATE_LIMITS = os.getenv("RATE_LIMITS", "on").lower() not in ("0", "off", "false", "no")
+# command -> (tokens refilled per second, burst) for each user
+COMMAND_LIMITS = {
+    "chat": (1 / 10, 3),
+    "image": (1 / 60, 2),
+    "say": (1 / 10, 3),
+    "voice": (1 / 10, 3),
+}
+DEFAULT_LIMIT = (1, 5)
+# Commands that spend a shared upstream quota, and the budget for all users together
+COMMAND_UPSTREAMS = {"chat": "gemini", "image": "huggingface", "say": "tts", "voice": "stt"}
+UPSTREAM_BUDGETS = {
+    "gemini": (5, 20),
+    "huggingface": (0.5, 5),
+    "tts": (5, 10),
+    "stt": (2, 10),
+}
+IDLE_SECONDS = 600
+
+# Telegram Bot API flood limits for outgoing messages
+GLOBAL_SENDS = (30, 30)
+CHAT_SENDS = (1, 3)
+GROUP_SENDS = (20 / 60, 3)
+
+# Buckets live in each process. With BOT_MODE=sharded the budgets shared by
+# everyone (UPSTREAM_BUDGETS and GLOBAL_SENDS) are split evenly between the
+# SHARD_COUNT workers, so all shards together stay within them. Per-user and
+# per-chat limits are not split: updates are routed by chat, so a private chat
+# always lands on the same shard; only a user active in group chats on
+# different shards can get more than their limit, at most once per shard.
+# The shard count is read when a bucket is built, not at import: spawned
+# workers import this module (via the main script) before SHARD_COUNT is set.
+
+
+def shard_share(budget):
+    rate, burst = budget
+    shards = shard_count()
+    return rate / shards, max(1, burst / shards)
+
+
+# ------------------------- Token buckets -------------------------
+class TokenBuckets:
+    # One bucket per key, stored as [tokens, last update] so an active key
+    # costs two floats. Keys idle longer than idle_seconds are dropped, which
+    # is the same as a full bucket.
+    def __init__(self, rate, burst, idle_seconds=IDLE_SECONDS):
+        self.rate = rate
+        self.burst = burst
+        self.idle_seconds = idle_seconds
+        self._buckets = OrderedDict()
+
+    def take(self, key, now=None):
+        # Takes one token; returns 0 on success, else seconds until one is available
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        bucket = self._buckets.pop(key, None) or [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        self._buckets[key] = bucket
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+    def refund(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + 1)
+
+    async def acquire(self, key):
+        # Waits until a token is free, then takes it
+        while True:
+            wait = self.take(key)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def _evict(self, now):
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle_seconds:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+_user_buckets = {command: TokenBuckets(*limit) for command, limit in COMMAND_LIMITS.items()}
+_default_buckets = TokenBuckets(*DEFAULT_LIMIT)
+_upstream_buckets = {}  # upstream -> TokenBuckets, built on first use
+_notified = TokenBuckets(1 / 30, 1)  # at most one cooldown reply per user every 30s
+
+
+def _upstream_bucket(upstream):
+    buckets = _upstream_buckets.get(upstream)
+    if buckets is None:
+        buckets = _upstream_buckets[upstream] = TokenBuckets(*shard_share(UPSTREAM_BUDGETS[upstream]))
+    return buckets
+
+
+def check(user_id, command):
+    # Returns 0 if the command may run now, else seconds to wait
+    wait = _user_buckets.get(command, _default_buckets).take((user_id, command))
+    if wait:
+        return wait
+    upstream = COMMAND_UPSTREAMS.get(command)
+    if upstream:
+        wait = _upstream_bucket(upstream).take(upstream)
+        if wait:
+            # Don't charge the user for a request we are not going to make
+            _user_buckets.get(command, _default_buckets).refund((user_id, command))
+            return wait
+    return 0
+
+
+# ------------------------- Incoming middleware -------------------------
+async def rate_limit(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Registered as a TypeHandler in group -1 so it runs before every command
+    message = update.message
+    if not RATE_LIMITS or not message or not update.effective_user:
+        return
+    if message.voice:
+        command = "voice"
+    elif message.text and message.text.startswith("/"):
+        command = message.text.split()[0][1:].split("@")[0].lower()
+    else:
+        return
+    user_id = update.effective_user.id
+    wait = check(user_id, command)
+    if not wait:
+        return
+    if not _notified.take(user_id):
+        what = "voice notes" if command == "voice" else f"/{command}"
+        await message.reply_text(f"⏳ Slow down! You can use {what} again in {int(wait) + 1}s.")
+    raise ApplicationHandlerStop
+
+
+# ------------------------- Outgoing smoothing -------------------------
+class OutboundLimiter(BaseRateLimiter):
+    # Spaces out Bot API calls to stay under Telegram's flood limits: ~30
+    # messages/second overall (shared between shards), ~1/second per chat and
+    # 20/minute per group.
+    # A RetryAfter from Telegram is waited out and the call retried once.
+    def __init__(self):
+        self.global_sends = TokenBuckets(*shard_share(GLOBAL_SENDS))
+        self.chat_sends = TokenBuckets(*CHAT_SENDS)
+        self.group_sends = TokenBuckets(*GROUP_SENDS)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is not None and RATE_LIMITS:
+            chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else chat_id
+            if isinstance(chat_id, int) and chat_id < 0:
+                await self.group_sends.acquire(chat_id)
+            else:
+                await self.chat_sends.acquire(chat_id)
+            await self.global_sends.acquire("global")
+        try:
+            return await self._call(callback, args, kwargs)
+        except RetryAfter as error:
+            retry_after = error.retry_after
+            await asyncio.sleep(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+            return await self._call(callback, args, kwargs)
+
+    async def _call(self, callback, args, kwargs):
+        # Every Bot API request passes through here, so this times Telegram itself
+        with metrics.upstream_call("telegram"):
+            return await callback(*args, **kwargs)
@@ -0,0 +1,131 @@
+import os
+import inspect
+import importlib
+import metrics
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes
+
+# ------------------------- Features -------------------------
+# Feature modules declare their commands, menu buttons, callback handlers and
+# background jobs with the decorators below, which run when the module is
+# imported. load_features() imports only the enabled features, so one turned
+# off with DISABLED_FEATURES (e.g. DISABLED_FEATURES=image,media) is never
+# imported at all. Heavy libraries (genai, gTTS, pydub, ...) are imported by
+# the features on first use, not at import time. Every registered handler is
+# wrapped with metrics.handler for latency, in-flight and trace ids.
+FEATURES = {
+    "ai": "modules.ai",
+    "weather": "modules.weather",
+    "news": "modules.news",
+    "digest": "modules.digest",
+    "reminders": "modules.productivity",
+    "finance": "modules.finance",
+    "fun": "modules.fun",
+    "trivia": "modules.trivia",
+    "image": "modules.images",
+    "media": "modules.media",
+}
+DISABLED_FEATURES = {name.strip() for name in os.getenv("DISABLED_FEATURES", "").split(",") if name.strip()}
+
+commands = []  # (name, handler, help line)
+buttons = []  # (label, callback data, handler(query))
+callbacks = []  # (callback data prefix, handler(query))
+messages = []  # (filter, handler)
+startup_hooks = []  # (hook(app), primary only)
+shutdown_hooks = []  # hook(app)
+
+
+def enabled(name):
+    return name in FEATURES and name not in DISABLED_FEATURES
+
+
+def load_features():
+    for name, module in FEATURES.items():
+        if enabled(name):
+            importlib.import_module(module)
+    return [name for name in FEATURES if enabled(name)]
+
+
+# ------------------------- Decorators -------------------------
+def command(name, help=None):
+    def decorator(fn):
+        commands.append((name, metrics.handler(name)(fn), help))
+        return fn
+    return decorator
+
+
+def button(label, data):
+    # Adds a button to the /start menu; fn(query) runs when it is pressed
+    def decorator(fn):
+        buttons.append((label, data, metrics.handler(f"button:{data}")(fn)))
+        return fn
+    return decorator
+
+
+def callback(prefix):
+    # fn(query) handles inline buttons whose callback data starts with prefix
+    def decorator(fn):
+        callbacks.append((prefix, metrics.handler(f"callback:{prefix.rstrip(':')}")(fn)))
+        return fn
+    return decorator
+
+
+def message(message_filter):
+    def decorator(fn):
+        messages.append((message_filter, metrics.handler(fn.__name__)(fn)))
+        return fn
+    return decorator
+
+
+def on_startup(primary=False):
+    # primary=True hooks run in one process only (see sharding.is_primary)
+    def decorator(fn):
+        startup_hooks.append((fn, primary))
+        return fn
+    return decorator
+
+
+def on_shutdown(fn):
+    shutdown_hooks.append(fn)
+    return fn
+
+
+async def call_hook(hook, app):
+    result = hook(app)
+    if inspect.isawaitable(result):
+        await result
+
+
+# ------------------------- Handlers -------------------------
+def menu():
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=data)] for label, data, _ in buttons])
+
+
+def help_text():
+    return "\n".join(help for _, _, help in commands if help)
+
+
+async def dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not query or query.data is None:
+        return
+    for prefix, handler in callbacks:
+        if query.data.startswith(prefix):
+            await handler(query)
+            return
+    try:
+        await query.answer()
+    except Exception:
+        pass
+    for _, data, handler in buttons:
+        if query.data == data:
+            await handler(query)
+            return
+
+
+def add_handlers(app):
+    for name, handler, _ in commands:
+        app.add_handler(CommandHandler(name, handler))
+    for message_filter, handler in messages:
+        app.add_handler(MessageHandler(message_filter, handler))
+    app.add_handler(CallbackQueryHandler(dispatch_callback))
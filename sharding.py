@@ -0,0 +1,221 @@
+import os
+import queue
+import asyncio
+import logging
+import importlib
+import multiprocessing
+from collections import deque
+from telegram import Bot, Update
+from telegram.error import NetworkError
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Config -------------------------
+# BOT_MODE=sharded runs one front process that receives updates (long polling,
+# or the webhook server with SHARD_INGRESS=webhook) and SHARD_WORKERS worker
+# processes that handle them. Updates are routed by chat_id, so each chat
+# always lands on the same worker and its updates are handled in order.
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", os.cpu_count() or 2))
+SHARD_INGRESS = os.getenv("SHARD_INGRESS", "polling")  # polling | webhook
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", 1000))
+SHARD_CONCURRENCY = int(os.getenv("SHARD_CONCURRENCY", 32))  # updates in flight per worker
+# Polling mode handles updates in one process the same way: chats run
+# concurrently, each chat's updates in order (see ChatOrderedProcessor)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 32))
+UPDATE_READ_AHEAD = int(os.getenv("UPDATE_READ_AHEAD", 1000))
+
+
+def shard_index():
+    return int(os.getenv("SHARD_INDEX", 0))
+
+
+def shard_count():
+    # Worker processes sharing this bot's global limits; 1 unless sharded
+    return int(os.getenv("SHARD_COUNT", 1))
+
+
+def is_primary():
+    # Singleton jobs (reminder dispatch, broadcasts) run in worker 0 only
+    return shard_index() == 0
+
+
+def chat_id_of(data):
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post",
+                "my_chat_member", "chat_member", "chat_join_request"):
+        if key in data:
+            return data[key]["chat"]["id"]
+    if "callback_query" in data:
+        query = data["callback_query"]
+        message = query.get("message")
+        return message["chat"]["id"] if message else query["from"]["id"]
+    for value in data.values():
+        if isinstance(value, dict) and "from" in value:
+            return value["from"]["id"]
+    return data.get("update_id", 0)
+
+
+def chat_of(update):
+    # The Update counterpart of chat_id_of; None for updates without a chat or user
+    if isinstance(update, Update):
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+    return None
+
+
+# ------------------------- Update processor -------------------------
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    # Lets the Application handle updates concurrently, like the per-chat
+    # drain in _work: an update waits for the previous update of its chat
+    # and only then takes one of the concurrency slots, so a slow chat holds
+    # a single slot. PTB's own semaphore just bounds the updates read ahead.
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, read_ahead=UPDATE_READ_AHEAD):
+        super().__init__(max(read_ahead, concurrency, 2))
+        self.concurrency = concurrency
+        self._slots = None
+        self._chats = {}  # chat_id -> event set when the chat's latest update is done
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    async def do_process_update(self, update, coroutine):
+        chat_id = chat_of(update)
+        if chat_id is None:
+            async with self._slots:
+                await coroutine
+            return
+        previous = self._chats.get(chat_id)
+        done = self._chats[chat_id] = asyncio.Event()
+        try:
+            if previous is not None:
+                await previous.wait()
+            async with self._slots:
+                await coroutine
+        finally:
+            coroutine.close()  # no-op once awaited; avoids a warning if cancelled while waiting
+            done.set()
+            if self._chats.get(chat_id) is done:
+                del self._chats[chat_id]
+
+
+# ------------------------- Worker processes -------------------------
+def worker_main(factory, index, count, updates):
+    # factory is "module:function" returning a configured Application; it is
+    # imported here because applications can't be pickled across processes
+    os.environ["SHARD_INDEX"] = str(index)
+    os.environ["SHARD_COUNT"] = str(count)
+    module_name, attr = factory.split(":")
+    application = getattr(importlib.import_module(module_name), attr)()
+    asyncio.run(_work(application, updates))
+
+
+async def _work(application, updates):
+    # Each busy chat gets one task that handles its updates in order. An
+    # update takes one of the SHARD_CONCURRENCY slots only when its turn
+    # comes, so a burst from one chat waits on that chat alone instead of
+    # holding slots every other chat needs. At most SHARD_QUEUE_SIZE updates
+    # are read ahead, so the front process still sees back-pressure.
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(SHARD_CONCURRENCY)
+    buffered = asyncio.Semaphore(SHARD_QUEUE_SIZE)
+    chats = {}  # chat_id -> deque of updates not yet started
+
+    async def drain(chat_id, pending):
+        try:
+            while pending:
+                update = pending.popleft()
+                try:
+                    async with slots:
+                        await application.process_update(update)
+                except Exception:
+                    logger.exception("Failed to process update %s", update.update_id)
+                finally:
+                    buffered.release()
+        finally:
+            del chats[chat_id]
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        while True:
+            await buffered.acquire()
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            chat_id = chat_id_of(data)
+            pending = chats.get(chat_id)
+            if pending is None:
+                pending = chats[chat_id] = deque()
+                loop.create_task(drain(chat_id, pending))
+            pending.append(Update.de_json(data, application.bot))
+    finally:
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+
+
+# ------------------------- Front process -------------------------
+async def _poll(token, queues):
+    loop = asyncio.get_running_loop()
+    async with Bot(token) as bot:
+        await bot.delete_webhook()
+        offset = None
+        while True:
+            try:
+                batch = await bot.get_updates(offset=offset, timeout=30, read_timeout=40,
+                                              allowed_updates=Update.ALL_TYPES)
+            except NetworkError:
+                await asyncio.sleep(1)
+                continue
+            for update in batch:
+                data = update.to_dict()
+                # Blocking put: a full worker queue slows polling down instead of dropping updates
+                await loop.run_in_executor(None, queues[chat_id_of(data) % len(queues)].put, data)
+                offset = update.update_id + 1
+
+
+async def _receive_webhooks(token, queues):
+    import webhook  # pulls in uvicorn, which polling mode doesn't need
+
+    def sink(data):
+        try:
+            queues[chat_id_of(data) % len(queues)].put_nowait(data)
+        except queue.Full:
+            return False
+        return True
+
+    async with Bot(token) as bot:
+        await webhook.set_webhook(bot)
+    await webhook.serve_app(webhook.WebhookApp(sink))
+
+
+def run(factory, token, workers=SHARD_WORKERS, ingress=SHARD_INGRESS):
+    # Spawned workers re-import the main script before worker_main runs, so
+    # anything it reads at import time must already see the shard count
+    os.environ["SHARD_COUNT"] = str(workers)
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(SHARD_QUEUE_SIZE) for _ in range(workers)]
+    processes = [
+        context.Process(target=worker_main, args=(factory, i, workers, q), name=f"shard-{i}", daemon=True)
+        for i, q in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        front = _receive_webhooks if ingress == "webhook" else _poll
+        asyncio.run(front(token, queues))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for q in queues:
+            q.put(None)
+        for process in processes:
+            process.join(timeout=10)
@@ -0,0 +1,39 @@
+import asyncio
+import functools
+import metrics
+from cache import normalize_text
+
+# ------------------------- Single-flight -------------------------
+# Concurrent calls with the same (source, key) share one in-flight upstream
+# call: the first caller starts it, everyone else awaits the same task.
+_inflight = {}
+_stats = {}
+
+
+def singleflight(source, key=None):
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            flight_key = (source, key(*args, **kwargs) if key else normalize_text(args))
+            counters = _stats.setdefault(source, {"calls": 0, "shared": 0})
+            counters["calls"] += 1
+            task = _inflight.get(flight_key)
+            if task is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                _inflight[flight_key] = task
+                task.add_done_callback(lambda _: _inflight.pop(flight_key, None))
+            else:
+                counters["shared"] += 1
+            # shield: one waiter being cancelled must not cancel the call for the rest
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    return {source: dict(counters) for source, counters in _stats.items()}
+
+
+metrics.stats_collector("singleflight", stats, label="source")
@@ -0,0 +1,155 @@
+import os
+import heapq
+import db
+
+# ------------------------- Shared state store -------------------------
+# State that must be shared between bot processes (who has been welcomed,
+# trivia scores, ...) goes through this small interface instead of module
+# globals. Pick the backend with STATE_STORE_URL:
+#   memory://            single process only
+#   sqlite:///ryzex.db   shared by processes on one machine (default: DATABASE_URL)
+#   redis://host:6379/0  shared across machines (needs the redis package)
+#
+# Methods are async so network backends fit the same interface:
+#   add(name, member)            -> True if member was not in the set yet
+#   get(name, key) / set(...)    -> string values in a hash-like namespace
+#   incr(name, key, amount)      -> new value of a numeric counter
+#   count(name, key)             -> current counter value (0 if missing)
+#   top(name, limit)             -> [(key, value)] with the highest counters
+
+
+class MemoryStore:
+    def __init__(self):
+        self._sets = {}
+        self._values = {}
+        self._counters = {}
+
+    async def add(self, name, member):
+        members = self._sets.setdefault(name, set())
+        if str(member) in members:
+            return False
+        members.add(str(member))
+        return True
+
+    async def get(self, name, key):
+        return self._values.get(name, {}).get(str(key))
+
+    async def set(self, name, key, value):
+        self._values.setdefault(name, {})[str(key)] = str(value)
+
+    async def incr(self, name, key, amount=1):
+        counters = self._counters.setdefault(name, {})
+        counters[str(key)] = counters.get(str(key), 0) + amount
+        return counters[str(key)]
+
+    async def count(self, name, key):
+        return self._counters.get(name, {}).get(str(key), 0)
+
+    async def top(self, name, limit=10):
+        counters = self._counters.get(name, {})
+        return heapq.nlargest(limit, counters.items(), key=lambda item: item[1])
+
+    async def close(self):
+        pass
+
+
+class SQLiteStore:
+    def __init__(self, path):
+        self.conn = db.connect() if path == db.get_db_path() else db.open_db(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS store_sets (name TEXT, member TEXT, PRIMARY KEY (name, member))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS store_values (name TEXT, key TEXT, value TEXT, PRIMARY KEY (name, key))")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS store_counters (name TEXT, key TEXT, value INTEGER, PRIMARY KEY (name, key))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS store_counters_top ON store_counters (name, value DESC)")
+
+    async def add(self, name, member):
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO store_sets (name, member) VALUES (?, ?)", (name, str(member))
+        )
+        return cursor.rowcount == 1
+
+    async def get(self, name, key):
+        row = self.conn.execute(
+            "SELECT value FROM store_values WHERE name = ? AND key = ?", (name, str(key))
+        ).fetchone()
+        return row[0] if row else None
+
+    async def set(self, name, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO store_values (name, key, value) VALUES (?, ?, ?)", (name, str(key), str(value))
+        )
+
+    async def incr(self, name, key, amount=1):
+        row = self.conn.execute(
+            """INSERT INTO store_counters (name, key, value) VALUES (?, ?, ?)
+               ON CONFLICT(name, key) DO UPDATE SET value = value + excluded.value
+               RETURNING value""",
+            (name, str(key), amount),
+        ).fetchone()
+        return row[0]
+
+    async def count(self, name, key):
+        row = self.conn.execute(
+            "SELECT value FROM store_counters WHERE name = ? AND key = ?", (name, str(key))
+        ).fetchone()
+        return row[0] if row else 0
+
+    async def top(self, name, limit=10):
+        return self.conn.execute(
+            "SELECT key, value FROM store_counters WHERE name = ? ORDER BY value DESC LIMIT ?", (name, limit)
+        ).fetchall()
+
+    async def close(self):
+        pass
+
+
+class RedisStore:
+    # Sets map to Redis sets, values to hashes and counters to sorted sets so
+    # top() is a single ZREVRANGE.
+    def __init__(self, url):
+        import redis.asyncio as redis
+        self.redis = redis.from_url(url, decode_responses=True)
+
+    async def add(self, name, member):
+        return await self.redis.sadd(name, str(member)) == 1
+
+    async def get(self, name, key):
+        return await self.redis.hget(name, str(key))
+
+    async def set(self, name, key, value):
+        await self.redis.hset(name, str(key), str(value))
+
+    async def incr(self, name, key, amount=1):
+        return int(await self.redis.zincrby(name, amount, str(key)))
+
+    async def count(self, name, key):
+        score = await self.redis.zscore(name, str(key))
+        return int(score) if score is not None else 0
+
+    async def top(self, name, limit=10):
+        rows = await self.redis.zrevrange(name, 0, limit - 1, withscores=True)
+        return [(key, int(score)) for key, score in rows]
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+_store = None
+
+
+def create_store(url):
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported STATE_STORE_URL: {url}")
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = create_store(os.getenv("STATE_STORE_URL") or os.getenv("DATABASE_URL", "sqlite:///ryzex.db"))
+    return _store
@@ -0,0 +1,30 @@
+import os
+import json
+import pytest
+from bench import run
+
+
+@pytest.fixture
+def environ():
+    # The bench points the bot at its fakes through os.environ
+    saved = dict(os.environ)
+    yield
+    os.environ.clear()
+    os.environ.update(saved)
+
+
+def test_smoke_run_reports_every_command(environ, tmp_path):
+    report_path = tmp_path / "report.json"
+    argv = ["--updates", "50", "--warmup", "10", "--concurrency", "8", "--users", "20",
+            "--latency", "5,gemini=20", "--json", str(report_path), "--max-errors", "0"]
+    assert run.main(argv) == 0
+
+    report = json.loads(report_path.read_text())
+    assert report["updates"] == 50
+    assert report["updates_per_second"] > 0
+    assert 0 < report["p50_ms"] <= report["p99_ms"]
+    assert set(report["commands"]) <= set(run.COMMANDS)
+    assert sum(row["count"] for row in report["commands"].values()) == 50
+    assert all(row["errors"] == 0 for row in report["commands"].values())
+    assert report["upstreams"]["telegram"]["requests"] > 0
+    assert report["telegram_methods"].get("sendMessage", 0) > 0
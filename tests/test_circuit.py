@@ -0,0 +1,187 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+import cache
+import circuit
+import http_client
+import utils
+from circuit import CircuitBreaker, CircuitOpen
+
+
+def make_breaker():
+    return CircuitBreaker("test", window=30, min_calls=4, failure_rate=0.5,
+                          open_seconds=10, max_open_seconds=40, half_open_calls=2)
+
+
+def open_breaker(breaker, now=100.0):
+    for ok in (True, True, False, False):
+        assert breaker.allow(now) is None
+        breaker.record(ok, now)
+    assert breaker.state == "open"
+
+
+# ------------------------- State machine -------------------------
+def test_opens_at_failure_rate():
+    breaker = make_breaker()
+    for ok in (True, True, False):
+        breaker.record(ok, 100.0)
+    assert breaker.state == "closed"  # fewer than min_calls
+    breaker.record(False, 100.0)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen) as error:
+        breaker.allow(105.0)
+    assert error.value.retry_in == 5.0
+    assert breaker.rejected == 1
+
+
+def test_failures_outside_the_window_are_forgotten():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(False, 100.0)
+    breaker.record(False, 131.0)
+    assert breaker.state == "closed"
+    assert breaker.counts(131.0) == (1, 1)
+
+
+def test_probes_close_the_breaker():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    first, second = breaker.allow(110.0), breaker.allow(110.0)
+    assert breaker.state == "half_open" and first == second == breaker.round
+    with pytest.raises(CircuitOpen):
+        breaker.allow(110.0)  # only half_open_calls probes at a time
+    breaker.record(True, 111.0, probe=first)
+    assert breaker.state == "half_open"
+    breaker.record(True, 111.0, probe=second)
+    assert breaker.state == "closed"
+    assert breaker.counts(111.0) == (0, 0)
+
+
+def test_failed_probe_doubles_the_backoff():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    for opened_at, open_for in ((110.0, 20), (130.0, 40), (170.0, 40)):
+        probe = breaker.allow(opened_at)
+        breaker.record(False, opened_at, probe=probe)
+        assert (breaker.state, breaker.open_for, breaker.opened_at) == ("open", open_for, opened_at)
+
+
+def test_late_outcomes_are_not_probes():
+    breaker = make_breaker()
+    late = breaker.allow(99.0)  # went out while closed, finishes after the breaker opened
+    open_breaker(breaker)
+    probe = breaker.allow(110.0)
+    breaker.record(True, 111.0, probe=late)
+    breaker.record(True, 111.0, probe=late)
+    assert breaker.state == "half_open"
+    breaker.record(False, 111.0, probe=late)
+    assert (breaker.state, breaker.open_for) == ("half_open", 10)
+    breaker.record(True, 112.0, probe=probe)
+    breaker.record(True, 112.0, probe=breaker.allow(112.0))
+    assert breaker.state == "closed"
+
+
+def test_probes_from_an_earlier_round_are_ignored():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    stale, failed = breaker.allow(110.0), breaker.allow(110.0)
+    breaker.record(False, 110.0, probe=failed)
+    probe = breaker.allow(130.0)
+    breaker.record(True, 131.0, probe=stale)
+    breaker.release(stale)
+    assert (breaker.state, breaker.probes, breaker.probe_successes) == ("half_open", 1, 0)
+    breaker.record(False, 131.0, probe=probe)
+    assert (breaker.state, breaker.open_for) == ("open", 40)
+
+
+def test_release_frees_a_probe_slot():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    probe = breaker.allow(110.0)
+    breaker.allow(110.0)
+    breaker.release(None)
+    with pytest.raises(CircuitOpen):
+        breaker.allow(110.0)
+    breaker.release(probe)
+    assert breaker.allow(110.0) == probe
+
+
+# ------------------------- Guard and http_client -------------------------
+@pytest.fixture
+def breakers(monkeypatch):
+    monkeypatch.setattr(circuit, "_breakers", {})
+    return circuit._breakers
+
+
+def test_guard_counts_429_and_5xx_but_not_ignored_statuses(breakers):
+    for upstream, code in (("newsapi", 429), ("newsapi", 502), ("newsapi", 404), ("huggingface", 503)):
+        with circuit.guard(upstream) as call:
+            call.status(code)
+    assert breakers["newsapi"].counts() == (3, 2)
+    assert breakers["huggingface"].counts() == (1, 0)
+
+
+@pytest.fixture
+def openweather(monkeypatch, breakers):
+    # Serves OpenWeather from a list of (status, payload) responses
+    responses = []
+
+    def handler(request):
+        status, payload = responses.pop(0)
+        return httpx.Response(status, json=payload)
+
+    client = httpx.AsyncClient(base_url="http://openweather.test", transport=httpx.MockTransport(handler))
+    monkeypatch.setitem(http_client._clients, "openweather", client)
+    monkeypatch.setitem(http_client._semaphores, "openweather", asyncio.Semaphore(1))
+    monkeypatch.setattr(cache, "_caches", {})
+    return responses
+
+
+def test_get_json_raises_on_rate_limit(openweather):
+    openweather.append((429, {"cod": 429, "message": "Too many requests"}))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(http_client.get_json("openweather", "/data/2.5/weather"))
+    assert circuit.get_breaker("openweather").counts() == (1, 1)
+
+
+# ------------------------- Cache fallback -------------------------
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(cache, "_caches", {})
+    return now
+
+
+def test_fallback_serves_the_last_good_value(clock):
+    outcomes = ["fresh"]
+
+    @cache.cached("test_fallback")
+    async def fetch(key):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def call():
+        return await fetch("key"), cache.fallback_age()
+
+    assert asyncio.run(call()) == ("fresh", None)
+    clock[0] += 900  # past ttl + STALE_TTL
+    outcomes.append(CircuitOpen("test", 5))
+    assert asyncio.run(call()) == ("fresh", 900)
+    clock[0] += cache.LAST_GOOD_TTL
+    outcomes.append(RuntimeError("down"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(call())
+    assert cache.stats()["test_fallback"]["fallbacks"] == 1
+
+
+def test_rate_limited_weather_falls_back_to_stale_data(openweather, clock):
+    openweather.append((200, {"cod": 200, "weather": [{"description": "rain"}], "main": {"temp": 11}}))
+    assert asyncio.run(utils.fetch_weather("Oslo", "key")) == "🌦 Weather in Oslo: rain, 🌡 11°C"
+    clock[0] += 1200
+    openweather.append((429, {"cod": 429, "message": "Too many requests"}))
+    reply = asyncio.run(utils.fetch_weather("Oslo", "key"))
+    assert reply.startswith("🌦 Weather in Oslo: rain") and "from 20 min ago" in reply
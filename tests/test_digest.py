@@ -0,0 +1,83 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timezone
+import pytest
+import broadcast
+import db
+import modules.digest as digest
+from modules.digest import DigestScheduler
+
+NOON = datetime(2026, 1, 5, 12, tzinfo=timezone.utc)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def scheduler(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, "_conn", db.open_db(str(tmp_path / "digest.db")))
+
+    async def build_texts():
+        return {"news:technology": "headlines"}
+
+    monkeypatch.setattr(digest, "build_texts", build_texts)
+    for chat_id in (1, 2, 3):
+        digest.subscribe(chat_id, "news", "technology")
+    scheduler = DigestScheduler(hour=7)
+    scheduler.bot = FakeBot()
+    yield scheduler
+    db.close()
+
+
+def fail_once(monkeypatch, target, name, calls=1):
+    # Lets `calls - 1` calls through, then raises "database is locked" once
+    original = getattr(target, name)
+    count = [0]
+
+    def wrapper(*args, **kwargs):
+        count[0] += 1
+        if count[0] == calls:
+            raise sqlite3.OperationalError("database is locked")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(target, name, wrapper)
+
+
+def test_sends_once_a_day(scheduler):
+    assert asyncio.run(scheduler.tick(NOON)) == 0
+    assert sorted(scheduler.bot.sent) == [1, 2, 3]
+    assert asyncio.run(scheduler.tick(NOON)) == 19 * 3600
+    assert len(scheduler.bot.sent) == 3
+
+
+def test_a_failed_pass_is_retried(scheduler, monkeypatch):
+    monkeypatch.setattr(digest, "ERROR_DELAY", 0.01)
+    scheduler.hour = 0  # _run uses the real clock: make today's digest due
+    fail_once(monkeypatch, broadcast, "create")
+
+    async def main():
+        scheduler._task = asyncio.get_running_loop().create_task(scheduler._run())
+        for _ in range(50):
+            if len(scheduler.bot.sent) == 3:
+                break
+            await asyncio.sleep(0.02)
+        await scheduler.stop()
+
+    asyncio.run(main())
+    assert sorted(scheduler.bot.sent) == [1, 2, 3]
+
+
+def test_interrupted_broadcast_resumes_on_the_next_pass(scheduler, monkeypatch):
+    scheduler.broadcaster.batch_size = 1
+    fail_once(monkeypatch, scheduler.broadcaster, "_record", calls=2)
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(scheduler.tick(NOON))
+    assert broadcast.unfinished()
+    asyncio.run(scheduler.tick(NOON))
+    assert set(scheduler.bot.sent) == {1, 2, 3}
+    assert broadcast.unfinished() == []
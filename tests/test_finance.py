@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+import db
+import modules.finance as finance
+from modules.finance import CoinIndex, QuoteWatcher
+
+
+@pytest.fixture
+def coingecko(monkeypatch, tmp_path):
+    # Serves one page of coins and counts the requests
+    monkeypatch.setattr(db, "_conn", db.open_db(str(tmp_path / "finance.db")))
+    requests = []
+
+    async def get_json(upstream, path, params=None):
+        requests.append(params["page"])
+        return [{"id": "pepe-token", "symbol": "PEPE"}, {"id": "bitcoin-fake", "symbol": "btc"}]
+
+    monkeypatch.setattr(finance.http_client, "get_json", get_json)
+    monkeypatch.setattr(finance, "coin_index", CoinIndex(size=2))
+    yield requests
+    db.close()
+
+
+def test_watcher_tick_downloads_a_stale_index(coingecko):
+    async def main():
+        await QuoteWatcher().tick()
+        await finance.coin_index._refresh_task
+        await QuoteWatcher().tick()  # fresh now: no second download
+
+    asyncio.run(main())
+    assert coingecko == [1]
+    assert finance.coin_index.resolve("pepe") == "pepe-token"
+    assert finance.coin_index.resolve("BTC") == "bitcoin"  # core coins win
+
+
+def test_other_shards_load_the_stored_index(coingecko, monkeypatch):
+    other = CoinIndex()
+    other.load()  # startup on a non-primary shard: nothing stored yet
+    assert other.resolve("pepe") is None
+
+    async def download():
+        await finance.coin_index.refresh()
+
+    asyncio.run(download())
+    monkeypatch.setattr(finance, "COIN_INDEX_RELOAD", 0)
+    assert other.resolve("pepe") == "pepe-token"
+    assert coingecko == [1]
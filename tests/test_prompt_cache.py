@@ -0,0 +1,99 @@
+import asyncio
+import functools
+from types import SimpleNamespace
+import pytest
+from bench.fakes import FakeModel
+import modules.ai as ai
+import modules.prompt_cache
+from modules.prompt_cache import PromptCache
+
+
+class CountingModel(FakeModel):
+    # Offline stand-in for Gemini; answers "answer <n>" for the n-th call
+    def __init__(self):
+        super().__init__(latency=0, chunks=1)
+        self.calls = 0
+
+    def _stream(self):
+        self.calls += 1
+        yield SimpleNamespace(text=f"answer {self.calls}")
+
+
+class FakeMessage:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+        return SimpleNamespace(edit_text=self.edit_text)
+
+    async def edit_text(self, text):
+        self.replies[-1] = text
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(ai, "_model", model)
+    monkeypatch.setattr(ai, "prompt_cache", PromptCache(ttl=60))
+    monkeypatch.setattr(ai, "conversations", ai.ConversationStore())
+    monkeypatch.setattr(ai, "StreamingReply", functools.partial(ai.StreamingReply, edits_per_second=1000))
+    return model
+
+
+chat_ids = iter(range(1, 10 ** 6))
+
+
+def ask(prompt, chat_id=None):
+    # A new chat unless chat_id is given, so the prompt starts a fresh conversation
+    message = FakeMessage(chat_id or next(chat_ids))
+    asyncio.run(ai.answer_chat(message, message.chat_id, prompt))
+    return message.replies[-1].removeprefix("🤖 AI says:\n")
+
+
+def test_normalized_prompt_hits(model):
+    assert ask("What is Python?") == "answer 1"
+    assert ask("what  is python") == "answer 1"
+    assert model.calls == 1
+    stats = ai.prompt_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_follow_ups_skip_the_cache(model):
+    ask("What is Python?")
+    assert ask("hello", chat_id=42) == "answer 2"
+    # Same words, but the answer would depend on chat 42's history
+    assert ask("what is python", chat_id=42) == "answer 3"
+    assert model.calls == 3
+    assert ai.prompt_cache.stats()["size"] == 2
+    ai.conversations.reset(42)
+    assert ask("what is python", chat_id=42) == "answer 1"
+
+
+def test_similar_prompts_miss_by_default(model):
+    for prompt in ("who is the president of the usa", "what is the population of india", "what is the capital of france"):
+        ask(prompt)
+    for prompt in ("who is the president of the uae", "what is the population of indiana", "what is the capital of frances"):
+        ask(prompt)
+    assert model.calls == 6
+    assert ai.prompt_cache.stats()["hits"] == 0
+
+
+def test_near_duplicates_need_the_same_content_words(model, monkeypatch):
+    monkeypatch.setattr(ai, "prompt_cache", PromptCache(ttl=60, similarity=0.5))
+    ask("what is the population of india")
+    assert ask("what is the population of indiana") == "answer 2"
+    assert ask("whats the population of india") == "answer 1"
+    assert ai.prompt_cache.stats()["near_hits"] == 1
+
+
+def test_entries_expire_after_ttl(model, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(modules.prompt_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    ask("what is python")
+    now[0] += 59
+    assert ask("what is python") == "answer 1"
+    now[0] += 2
+    assert ask("what is python") == "answer 2"
+    assert model.calls == 2
@@ -0,0 +1,28 @@
+import asyncio
+import pytest
+import broadcast
+import ratelimit
+
+
+@pytest.fixture
+def four_shards(monkeypatch):
+    # Set after import, like a spawned worker that re-imported the main script
+    monkeypatch.setenv("SHARD_COUNT", "4")
+    monkeypatch.setattr(ratelimit, "_upstream_buckets", {})
+
+
+def test_shared_budgets_are_split_between_shards(four_shards):
+    assert ratelimit.shard_share((30, 30)) == (7.5, 7.5)
+    assert ratelimit._upstream_bucket("gemini").rate == 1.25
+    assert ratelimit.OutboundLimiter().global_sends.rate == 7.5
+
+
+def test_broadcaster_built_before_sharding_splits_its_rate(monkeypatch, tmp_path):
+    broadcaster = broadcast.Broadcaster(rate=20)  # e.g. at module import
+    monkeypatch.setenv("SHARD_COUNT", "4")
+    monkeypatch.setattr(broadcast.db, "_conn", broadcast.db.open_db(str(tmp_path / "broadcast.db")))
+    broadcast.init_broadcasts()
+    asyncio.run(broadcaster.deliver(None, 1))
+    broadcast.db.close()
+    assert broadcaster._sends.rate == 5
+
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+import db
+import modules.productivity as productivity
+from modules.productivity import ReminderScheduler
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, "_conn", db.open_db(str(tmp_path / "reminders.db")))
+    yield
+    db.close()
+
+
+def test_add_creates_the_table(database):
+    # Shards other than 0 add reminders without ever starting the loop
+    ReminderScheduler().add(1, 5, "stretch")
+    assert ReminderScheduler().pending_count() == 1
+
+
+def test_reminders_added_by_another_shard_are_sent(database, monkeypatch):
+    monkeypatch.setattr(productivity, "MAX_IDLE", 0.05)
+    bot = FakeBot()
+
+    async def main():
+        primary, other = ReminderScheduler(), ReminderScheduler()
+        primary.start(bot)
+        await asyncio.sleep(0.1)  # nothing pending: the loop is idle
+        other.add(7, 0, "stretch")
+        for _ in range(40):
+            if bot.sent:
+                break
+            await asyncio.sleep(0.05)
+        await primary.stop()
+        return primary.pending_count()
+
+    assert asyncio.run(main()) == 0
+    assert bot.sent == [(7, "⏰ Reminder: stretch")]
@@ -0,0 +1,56 @@
+import asyncio
+from telegram import Update
+from sharding import ChatOrderedProcessor, chat_of
+
+
+def make_update(update_id, chat_id):
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "text": "/weather Oslo",
+                    "chat": {"id": chat_id, "type": "private"}},
+    }, None)
+
+
+def test_chat_of():
+    assert chat_of(make_update(1, 42)) == 42
+    assert chat_of(object()) is None
+
+
+def test_chats_overlap_and_each_chat_stays_in_order():
+    events = []
+
+    async def handle(update):
+        events.append(("start", update.update_id))
+        await asyncio.sleep(0.05)
+        events.append(("end", update.update_id))
+
+    async def main():
+        processor = ChatOrderedProcessor(concurrency=8)
+        async with processor:
+            updates = [make_update(1, 10), make_update(2, 10), make_update(3, 20)]
+            started = asyncio.get_running_loop().time()
+            await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+            return asyncio.get_running_loop().time() - started
+
+    elapsed = asyncio.run(main())
+    # chat 20 ran alongside chat 10's first update; chat 10's second waited for its first
+    assert events.index(("start", 3)) < events.index(("end", 1))
+    assert events.index(("end", 1)) < events.index(("start", 2))
+    assert elapsed < 0.15
+
+
+def test_a_slow_chat_holds_a_single_slot():
+    finished = []
+
+    async def handle(update, delay):
+        await asyncio.sleep(delay)
+        finished.append(update.update_id)
+
+    async def main():
+        async with ChatOrderedProcessor(concurrency=2) as processor:
+            slow = [processor.process_update(make_update(i, 10), handle(make_update(i, 10), 0.2)) for i in range(1, 4)]
+            fast = processor.process_update(make_update(9, 20), handle(make_update(9, 20), 0.01))
+            await asyncio.gather(*slow, fast)
+
+    asyncio.run(main())
+    assert finished == [9, 1, 2, 3]
@@ -1,22 +1,61 @@
-import requests
+import http_client
+import metrics
+from cache import cached, fallback_age, normalize_city
+from singleflight import singleflight
 
-def fetch_weather(city, api_key):
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-    data = requests.get(url).json()
+@metrics.timed("weather")
+@cached("weather", key=normalize_city)
+@singleflight("weather", key=normalize_city)
+async def get_weather_data(city, api_key):
+    params = {"q": city, "appid": api_key, "units": "metric"}
+    data = await http_client.get_json("openweather", "/data/2.5/weather", params=params)
+    if data.get("cod") != 200 and "," in city:
+        # Retry just city name
+        params["q"] = city.split(",")[0]
+        data = await http_client.get_json("openweather", "/data/2.5/weather", params=params)
     if data.get("cod") != 200:
         return None
-    return f"🌦 Weather in {city}: {data['weather'][0]['description']}, 🌡 {data['main']['temp']}°C"
+    return data
 
-def fetch_news(api_key):
-    url = f"https://newsapi.org/v2/top-headlines?country=in&category=technology&apiKey={api_key}"
-    data = requests.get(url).json()
-    articles = data.get("articles", [])[:5]
-    headlines = "\n\n".join([f"📰 {a['title']} ({a['source']['name']})" for a in articles])
-    return f"🔥 Top Tech News:\n\n{headlines}"
+def stale_note():
+    # Set when a cached fetcher served its last known good value during an outage
+    age = fallback_age()
+    if age is None:
+        return ""
+    return f"\n\n⚠️ Service unavailable, showing data from {int(age // 60)} min ago."
 
-def fetch_fun_fact():
+async def fetch_weather(city, api_key):
+    data = await get_weather_data(city, api_key)
+    if data is None:
+        return None
+    return f"🌦 Weather in {city}: {data['weather'][0]['description']}, 🌡 {data['main']['temp']}°C" + stale_note()
+
+def news_key(api_key, category="technology"):
+    return category
+
+@metrics.timed("news")
+@cached("news", key=news_key)
+@singleflight("news", key=news_key)
+async def get_headlines(api_key, category="technology"):
+    params = {"country": "in", "category": category, "apiKey": api_key}
+    data = await http_client.get_json("newsapi", "/v2/top-headlines", params=params)
+    if data.get("status") != "ok":
+        return None
+    return data.get("articles", [])
+
+def format_news(articles, category="technology"):
+    # Call right after get_headlines so the stale note belongs to that lookup
+    headlines = "\n\n".join([f"📰 {a['title']} ({a['source']['name']})" for a in articles[:5]])
+    title = "Tech" if category == "technology" else category.title()
+    return f"🔥 Top {title} News:\n\n{headlines}{stale_note()}"
+
+async def fetch_news(api_key, category="technology"):
+    return format_news(await get_headlines(api_key, category) or [], category)
+
+@metrics.timed("fun_fact")
+async def fetch_fun_fact():
     try:
-        data = requests.get("https://uselessfacts.jsph.pl/random.json?language=en").json()
+        data = await http_client.get_json("uselessfacts", "/random.json", params={"language": "en"})
         return data['text']
-    except:
-        return "⚠️ Couldn't fetch fun fact right now!"
+    except Exception:
+        return None
@@ -0,0 +1,155 @@
+import os
+import json
+import hmac
+import secrets
+import asyncio
+import logging
+import uvicorn
+from telegram import Update
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# ------------------------- Config -------------------------
+# BOT_MODE=webhook switches run_bot() from long polling to this server.
+# WEBHOOK_URL is the public URL registered with Telegram; leave it unset to
+# test locally by POSTing recorded update JSON to WEBHOOK_PATH.
+# Every update must carry the secret token. Without WEBHOOK_SECRET a random
+# one is generated at startup and registered with Telegram by set_webhook().
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+GENERATED_SECRET = not os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 8))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+MAX_BODY_BYTES = 1024 * 1024
+
+
+# ------------------------- ASGI app -------------------------
+class WebhookApp:
+    # Validates the secret token, hands the update JSON to sink and answers
+    # 200 right away. sink(data) returns False when it can't take the update
+    # (queue full), which answers 503 so Telegram retries the delivery later.
+    def __init__(self, sink, secret=WEBHOOK_SECRET, path=WEBHOOK_PATH):
+        self.sink = sink
+        self.secret = secret
+        self.path = path
+        self.routes = {("GET", "/healthz"): self.healthz, ("GET", "/metrics"): self.metrics}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while (await receive())["type"] != "lifespan.shutdown":
+                await send({"type": "lifespan.startup.complete"})
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+        if scope["type"] != "http":
+            return
+
+        route = (scope["method"], scope["path"])
+        if route == ("POST", self.path):
+            status, body = await self.receive_update(scope, receive)
+        elif route in self.routes:
+            status, body = await self.routes[route](scope, receive)
+        else:
+            status, body = 404, b"not found"
+        await respond(send, status, body)
+
+    async def receive_update(self, scope, receive):
+        headers = dict(scope["headers"])
+        token = headers.get(b"x-telegram-bot-api-secret-token", b"")
+        if not hmac.compare_digest(token, self.secret.encode()):
+            return 403, b"forbidden"
+        body = await read_body(receive)
+        if body is None:
+            return 413, b"too large"
+        try:
+            accepted = self.sink(json.loads(body))
+        except (ValueError, TypeError, KeyError):
+            return 400, b"bad update"
+        if not accepted:
+            return 503, b"busy"
+        return 200, b"ok"
+
+    async def healthz(self, scope, receive):
+        return 200, b"ok"
+
+    async def metrics(self, scope, receive):
+        return 200, metrics.render().encode()
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            return None
+        if not message.get("more_body"):
+            return body
+
+
+async def respond(send, status, body=b"", content_type=b"text/plain"):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body})
+
+
+# ------------------------- Update workers -------------------------
+async def update_worker(application, queue):
+    while True:
+        update = await queue.get()
+        try:
+            await application.process_update(update)
+        except Exception:
+            logger.exception("Failed to process update %s", update.update_id)
+        finally:
+            queue.task_done()
+
+
+async def set_webhook(bot):
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    elif GENERATED_SECRET:
+        # Local testing: the replayed updates need the token too
+        logger.warning("WEBHOOK_SECRET not set; using generated secret %s", WEBHOOK_SECRET)
+
+
+async def serve_app(web_app, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    server = uvicorn.Server(uvicorn.Config(web_app, host=host, port=port, log_level="warning"))
+    await server.serve()
+
+
+async def serve(application, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE):
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    def sink(data):
+        try:
+            queue.put_nowait(Update.de_json(data, application.bot))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await set_webhook(application.bot)
+    await application.start()
+    tasks = [asyncio.create_task(update_worker(application, queue)) for _ in range(workers)]
+    try:
+        await serve_app(WebhookApp(sink))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        await application.shutdown()
+
+
+def run(application):
+    asyncio.run(serve(application))
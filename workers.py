@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import metrics
+
+# ------------------------- Pool config -------------------------
+# Blocking work runs in a pool sized for its workload class so a burst of one
+# kind (e.g. /say) can't delay the others. max_pending caps running + queued
+# jobs; past that, run() rejects immediately with PoolBusy.
+# Override from the environment with WORKERS_<NAME> and WORKER_QUEUE_<NAME>.
+POOLS = {
+    "audio": {"kind": "process", "workers": max(1, (os.cpu_count() or 2) // 2), "max_pending": 16},
+    "tts": {"kind": "thread", "workers": 4, "max_pending": 32},
+    "stt": {"kind": "thread", "workers": 4, "max_pending": 32},
+    "llm": {"kind": "thread", "workers": 8, "max_pending": 64},
+}
+
+
+BUSY_MESSAGE = "⏳ I'm busy right now, please try again in a moment."
+
+
+class PoolBusy(Exception):
+    pass
+
+
+_executors = {}
+_pending = {}
+_stats = {}
+
+
+def _setting(name, key):
+    env_prefix = {"workers": "WORKERS", "max_pending": "WORKER_QUEUE"}[key]
+    return int(os.getenv(f"{env_prefix}_{name.upper()}", POOLS[name][key]))
+
+
+def get_executor(name):
+    executor = _executors.get(name)
+    if executor is None:
+        workers = _setting(name, "workers")
+        if POOLS[name]["kind"] == "process":
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        _executors[name] = executor
+        _pending[name] = 0
+        _stats[name] = {"completed": 0, "rejected": 0, "failed": 0, "wait_total": 0.0, "wait_max": 0.0}
+    return executor
+
+
+def _timed_call(submitted_at, fn, args, kwargs):
+    # Runs inside the worker (thread or process), so it must stay picklable
+    started_at = time.time()
+    return started_at - submitted_at, fn(*args, **kwargs)
+
+
+# ------------------------- Running jobs -------------------------
+async def run(name, fn, *args, **kwargs):
+    executor = get_executor(name)
+    stats = _stats[name]
+    if _pending[name] >= _setting(name, "max_pending"):
+        stats["rejected"] += 1
+        raise PoolBusy(name)
+
+    _pending[name] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        wait, result = await loop.run_in_executor(executor, _timed_call, time.time(), fn, args, kwargs)
+    except Exception:
+        stats["failed"] += 1
+        raise
+    finally:
+        _pending[name] -= 1
+
+    stats["completed"] += 1
+    stats["wait_total"] += wait
+    stats["wait_max"] = max(stats["wait_max"], wait)
+    return result
+
+
+def stats():
+    result = {}
+    for name, counters in _stats.items():
+        done = counters["completed"]
+        result[name] = dict(
+            counters,
+            pending=_pending[name],
+            wait_avg=counters["wait_total"] / done if done else 0.0,
+        )
+    return result
+
+
+metrics.stats_collector("worker_pool", stats, label="pool")
+
+
+def shutdown():
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()